@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark: measures read_docx_files_from_work_doc and prompt assembly
+on synthetic corpora of increasing size and saves the numbers as JSON.
+
+    python benchmarks/bench_ingestion.py --sizes 10,100,1000
+    python benchmarks/bench_ingestion.py --sizes 10,100 --compare benchmarks/results/baseline.json
+
+Each scenario runs in a fresh process so "cold" really starts from nothing:
+  cold       - empty corpus store, every file parsed
+  warm       - second read in the same process (stat checks only)
+  restart    - new process, text loaded from the corpus store
+  touched    - 10% of the files touched (mtime changed, same content: hashed, not parsed)
+  added_one  - one new file added (parsed)
+Peak memory is the process' maximum resident set size (not available on Windows).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Questions timed through prompt assembly (not count questions, which the metrics table answers)
+QUESTIONS = [
+    "What are my biggest achievements?",
+    "What did I work on regarding telemetry dashboards?",
+    "Summarize my reliability work in the last three months",
+]
+CONTEXT_MODES = ["retrieval", "full"]
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def _report_counts(report):
+    return {key: len(names) for key, names in (report or {}).items()}
+
+def run_child(scenario, corpus_dir):
+    """
+    Runs one scenario in this (fresh) process and returns its measurements.
+    The environment (WORK_DOC_DIR, CORPUS_STORE_PATH, ...) is set by the parent.
+    """
+    sys.path.insert(0, str(REPO_DIR))
+    started = time.perf_counter()
+    import work_impact_agent as agent
+    result = {"import_s": time.perf_counter() - started}
+
+    files, result["first_read_s"] = _timed(agent.read_docx_files_from_work_doc)
+    result["documents_read"] = len(files)
+    result["first_read_report"] = _report_counts(agent.get_last_reload_report())
+
+    if scenario == "cold":
+        _, result["warm_s"] = _timed(agent.read_docx_files_from_work_doc)
+        result["prompt_assembly_ms"] = {}
+        for mode in CONTEXT_MODES:
+            timings = []
+            for question in QUESTIONS:
+                _, seconds = _timed(agent._prepare_request, question, mode)
+                timings.append(seconds * 1000)
+            result["prompt_assembly_ms"][mode] = {
+                "first": round(timings[0], 2),
+                "median": round(statistics.median(timings), 2),
+            }
+
+    elif scenario == "restart":
+        paths = sorted(Path(corpus_dir).glob("*.docx"))
+        now = time.time()
+        for path in paths[::10]:
+            os.utime(path, (now, now))
+        _, result["touched_s"] = _timed(agent.read_docx_files_from_work_doc)
+        result["touched_report"] = _report_counts(agent.get_last_reload_report())
+
+        from generate_corpus import generate_document
+        import random
+        added = Path(corpus_dir) / "December_2099.docx"
+        generate_document(added, random.Random(99), "December_2099", items=20, tables=1, images=1, image_size=256)
+        try:
+            _, result["added_one_s"] = _timed(agent.read_docx_files_from_work_doc)
+            result["added_one_report"] = _report_counts(agent.get_last_reload_report())
+        finally:
+            added.unlink()
+
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+def _run_scenario(scenario, corpus_dir, store_path, args):
+    env = dict(os.environ)
+    env.update({
+        "WORK_DOC_DIR": str(corpus_dir),
+        "CORPUS_STORE_PATH": str(store_path),
+        "RESPONSE_CACHE_PATH": "",
+        "PREWARM_EXAMPLES": "0",
+    })
+    if args.extractor:
+        env["DOCX_EXTRACTOR"] = args.extractor
+    if args.workers is not None:
+        env["DOCX_WORKERS"] = str(args.workers)
+
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", scenario, str(corpus_dir)],
+        env=env, capture_output=True, text=True, cwd=str(Path(__file__).resolve().parent),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{scenario} scenario failed:\n{completed.stderr[-4000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _ensure_corpus(corpus_root, size, seed):
+    """
+    Returns a synthetic corpus of the given size, generating it on first use.
+    """
+    from generate_corpus import generate_corpus
+
+    corpus_dir = Path(corpus_root) / f"docs-{size}-seed{seed}"
+    marker = corpus_dir / ".complete"
+    if not marker.exists():
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+        print(f"Generating {size} documents in {corpus_dir}...", file=sys.stderr)
+        generate_corpus(corpus_dir, size, seed)
+        marker.touch()
+    return corpus_dir
+
+def benchmark_size(size, args):
+    corpus_dir = _ensure_corpus(args.corpus_dir, size, args.seed)
+    store_path = Path(args.corpus_dir) / f"store-{size}.sqlite3"
+    for stale in Path(args.corpus_dir).glob(f"store-{size}.sqlite3*"):
+        stale.unlink()
+
+    cold = _run_scenario("cold", corpus_dir, store_path, args)
+    restart = _run_scenario("restart", corpus_dir, store_path, args)
+    corpus_bytes = sum(path.stat().st_size for path in corpus_dir.glob("*.docx"))
+
+    return {
+        "documents": size,
+        "corpus_mb": round(corpus_bytes / 1e6, 2),
+        "cold_s": round(cold["first_read_s"], 4),
+        "warm_s": round(cold["warm_s"], 4),
+        "restart_s": round(restart["first_read_s"], 4),
+        "touched_s": round(restart["touched_s"], 4),
+        "added_one_s": round(restart["added_one_s"], 4),
+        "import_s": round(cold["import_s"], 4),
+        "peak_rss_mb_cold": cold["peak_rss_mb"],
+        "peak_rss_mb_restart": restart["peak_rss_mb"],
+        "prompt_assembly_ms": cold["prompt_assembly_ms"],
+        "reload_reports": {
+            "cold": cold["first_read_report"],
+            "restart": restart["first_read_report"],
+            "touched": restart["touched_report"],
+            "added_one": restart["added_one_report"],
+        },
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def _flatten(result, prefix=""):
+    values = {}
+    for key, value in result.items():
+        if key in ("documents", "reload_reports"):
+            continue
+        if isinstance(value, dict):
+            values.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            values[f"{prefix}{key}"] = value
+    return values
+
+def compare(baseline_path, current):
+    """
+    Prints every metric of the current run next to the baseline run.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result["documents"]: result for result in json.load(f)["results"]}
+    for result in current["results"]:
+        before = baseline.get(result["documents"])
+        if before is None:
+            continue
+        print(f"\n{result['documents']} documents (baseline {baseline_path})")
+        old_values = _flatten(before)
+        for key, new in _flatten(result).items():
+            old = old_values.get(key)
+            if old is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {key:<36} {old:>12} -> {new:<12} {change}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark docx ingestion and prompt assembly.")
+    parser.add_argument("--sizes", default="10,100,1000",
+                        help="comma-separated corpus sizes (documents), e.g. 10,100,1000,5000")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--corpus-dir", default=str(REPO_DIR / ".cache" / "bench_corpora"),
+                        help="where generated corpora are kept between runs")
+    parser.add_argument("--extractor", default=None, help="DOCX_EXTRACTOR to benchmark")
+    parser.add_argument("--workers", type=int, default=None, help="DOCX_WORKERS to benchmark")
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/ingestion-<time>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        result = benchmark_size(size, args)
+        results.append(result)
+        print(f"{size:>6} docs: cold {result['cold_s']:.3f}s, warm {result['warm_s']:.4f}s, "
+              f"restart {result['restart_s']:.3f}s, touched {result['touched_s']:.3f}s, "
+              f"added one {result['added_one_s']:.3f}s, peak {result['peak_rss_mb_cold']} MB", file=sys.stderr)
+
+    run = {
+        "benchmark": "ingestion",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "seed": args.seed,
+            "extractor": args.extractor or os.getenv("DOCX_EXTRACTOR", "python-docx"),
+            "workers": args.workers if args.workers is not None else os.getenv("DOCX_WORKERS", "1"),
+            "questions": QUESTIONS,
+        },
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"ingestion-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(run, indent=2) + "\n", encoding="utf-8")
+    print(f"Results saved to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(args.compare, run)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        print(json.dumps(run_child(sys.argv[2], sys.argv[3])))
+    else:
+        main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Generates a synthetic work_doc corpus for benchmarks: monthly-summary style .docx
+files with work items, tables and embedded images, in varied sizes.
+
+    python benchmarks/generate_corpus.py OUTPUT_DIR --count 500 [--seed 7]
+"""
+
+import argparse
+import io
+import random
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+from docx import Document
+from docx.shared import Inches
+
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December"]
+_TYPES = ["Bug Fix", "New Feature", "Enhancement", "Refactor", "Performance Improvement", "UI Improvement"]
+_SECTIONS = ["🚀 Core Feature Work", "🐛 Reliability & Bug Fixes", "⚡ Performance", "🧹 Maintenance",
+             "🤝 Collaboration & Mentoring"]
+_WORDS = """
+    telemetry pipeline ingestion dashboard kusto query latency cache retry throttling incident
+    enrichment agent prompt token report deployment rollout alert monitoring schema migration
+    parser validation coverage refactor module service endpoint queue worker batch scheduler
+    reliability regression investigation customer escalation onboarding documentation review
+""".split()
+
+def _sentence(rng, words=14):
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def _png(rng, width, height):
+    """
+    Returns PNG bytes of random noise (incompressible, so the image size is
+    roughly width * height * 3 bytes).
+    """
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1))
+            + chunk(b"IEND", b""))
+
+def document_name(index):
+    """
+    Returns the name of the index-th document: monthly names going back in time
+    from December 2025, with a sequence suffix once every month is taken.
+    """
+    months_back, repeat = index % 312, index // 312  # 26 years of months
+    year, month = 2025 - months_back // 12, 12 - months_back % 12
+    name = f"{_MONTHS[month - 1]}_{year}"
+    return name if repeat == 0 else f"{name}-{repeat:03d}"
+
+def generate_document(path, rng, month_name, items, tables, images, image_size):
+    """
+    Writes one synthetic monthly summary with the given number of work items,
+    tables and images.
+    """
+    document = Document()
+    document.add_heading(f"Monthly PR & Impact Summary — {month_name.replace('_', ' ')}", level=1)
+    document.add_paragraph("")
+
+    pr_number = rng.randint(10000, 90000)
+    for i in range(items):
+        if i % max(1, items // len(_SECTIONS)) == 0:
+            document.add_paragraph(rng.choice(_SECTIONS))
+        pr_number += rng.randint(1, 400)
+        title = _sentence(rng, rng.randint(5, 9)).rstrip(".")
+        for line in [
+            title,
+            f"Type: {rng.choice(_TYPES)}",
+            f"Date: {rng.randint(1, 28)} {month_name.replace('_', ' ')}",
+            "Summary:",
+            *(_sentence(rng, rng.randint(10, 30)) for _ in range(rng.randint(1, 4))),
+            f"PR link: Pull request {pr_number}: {title} - Repos",
+        ]:
+            document.add_paragraph(line, style="List Paragraph")
+
+    for _ in range(tables):
+        rows = rng.randint(3, 8)
+        table = document.add_table(rows=rows, cols=3)
+        for r in range(rows):
+            for c in range(3):
+                table.cell(r, c).text = rng.choice(_WORDS) if r == 0 else str(rng.randint(1, 500))
+
+    for _ in range(images):
+        side = rng.randint(image_size // 2, image_size)
+        document.add_picture(io.BytesIO(_png(rng, side, side)), width=Inches(2))
+
+    document.save(path)
+
+def generate_corpus(directory, count, seed=7, max_items=40, max_tables=3, max_images=2, image_size=256):
+    """
+    Fills directory with count synthetic .docx files of varied sizes (1 to
+    max_items work items, up to max_tables tables and max_images images each).
+    The same seed always produces the same corpus. Returns the file paths.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        name = document_name(index)
+        path = directory / f"{name}.docx"
+        generate_document(
+            path, rng, name.split("-")[0],
+            items=rng.randint(1, max_items),
+            tables=rng.randint(0, max_tables),
+            images=rng.randint(0, max_images),
+            image_size=image_size,
+        )
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic work_doc corpus.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-items", type=int, default=40, help="work items per document (1 to N)")
+    parser.add_argument("--max-tables", type=int, default=3)
+    parser.add_argument("--max-images", type=int, default=2)
+    parser.add_argument("--image-size", type=int, default=256, help="largest image side in pixels")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output_dir, args.count, args.seed, args.max_items,
+                            args.max_tables, args.max_images, args.image_size)
+    total = sum(path.stat().st_size for path in paths)
+    print(f"Generated {len(paths)} documents ({total / 1e6:.1f} MB) in {args.output_dir}", file=sys.stderr)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Startup profile: how long importing each entry point takes, and where that time goes.
+
+    python benchmarks/profile_startup.py                       # run_agent, work_impact_agent, gradio_advanced_ui
+    python benchmarks/profile_startup.py run_agent --budget-ms 150
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+(best of --repeat runs). The report lists the import time per top-level
+package (self time summed over all its modules) and the slowest direct imports.
+The exit code is 1 when a module takes longer to import than its budget
+(IMPORT_BUDGETS_MS, or --budget-ms for every module), so CI can check it.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Import budget per entry point, in milliseconds. The CLI and the agent must not
+# pull in openai, httpx, python-docx or gradio at import time; the web UI is
+# bounded by gradio's own import (about 3 s)
+IMPORT_BUDGETS_MS = {
+    "run_agent": 300,
+    "work_impact_agent": 300,
+    "gradio_advanced_ui": 5000,
+}
+DEFAULT_MODULES = list(IMPORT_BUDGETS_MS)
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output into (name, depth, self_us, cumulative_us) rows.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+def profile_module(module, repeat):
+    """
+    Imports module in fresh interpreters and returns the fastest run:
+    {"module", "import_ms", "wall_ms", "rows"}.
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONIMPORTTIME", None)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-4000:]}")
+        rows = parse_importtime(completed.stderr)
+        import_ms = next((cumulative for name, depth, _, cumulative in rows
+                          if name == module and depth == 0), 0) / 1000
+        if best is None or import_ms < best["import_ms"]:
+            best = {"module": module, "import_ms": import_ms, "wall_ms": wall_ms, "rows": rows}
+    return best
+
+def summarize(profile, top):
+    """
+    Groups a profile's self times by top-level package and picks the slowest
+    imports made directly by the module.
+    """
+    packages = defaultdict(int)
+    for name, _, self_us, _ in profile["rows"]:
+        packages[name.split(".")[0]] += self_us
+    # Rows come children first: the module's direct imports are the depth-1 rows
+    # between the previous top-level import and the module itself
+    direct, pending = [], []
+    for name, depth, _, cumulative in profile["rows"]:
+        if depth == 1:
+            pending.append((name, cumulative))
+        elif depth == 0:
+            if name == profile["module"]:
+                direct = pending
+            pending = []
+    return {
+        "module": profile["module"],
+        "import_ms": round(profile["import_ms"], 1),
+        "wall_ms": round(profile["wall_ms"], 1),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in
+                        sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]},
+        "direct_imports_ms": {name: round(us / 1000, 1) for name, us in
+                              sorted(direct, key=lambda item: item[1], reverse=True)[:top]},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile how long the entry points take to import.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module; the fastest is reported")
+    parser.add_argument("--top", type=int, default=10, help="packages and imports listed per module")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail (exit code 1) when a module takes longer than this to import "
+                             "(default: the module's entry in IMPORT_BUDGETS_MS)")
+    parser.add_argument("--json", metavar="FILE", help="also save the report as JSON")
+    args = parser.parse_args()
+
+    reports = [summarize(profile_module(module, max(1, args.repeat)), args.top) for module in args.modules]
+
+    over_budget = []
+    for report in reports:
+        budget_ms = args.budget_ms if args.budget_ms is not None else IMPORT_BUDGETS_MS.get(report["module"])
+        report["budget_ms"] = budget_ms
+        budget = f", budget {budget_ms:g} ms" if budget_ms is not None else ""
+        print(f"\n{report['module']}: import {report['import_ms']:.1f} ms "
+              f"(process incl. interpreter {report['wall_ms']:.1f} ms{budget})")
+        print("  by package (self time):")
+        for name, ms in report["packages_ms"].items():
+            print(f"    {name:<40} {ms:>8.1f} ms")
+        print("  slowest direct imports (cumulative):")
+        for name, ms in report["direct_imports_ms"].items():
+            print(f"    {name:<40} {ms:>8.1f} ms")
+        if budget_ms is not None and report["import_ms"] > budget_ms:
+            over_budget.append(f"{report['module']} ({report['import_ms']:.0f} > {budget_ms:g} ms)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"modules": reports}, indent=2) + "\n", encoding="utf-8")
+
+    if over_budget:
+        print(f"\nOver the import budget: {', '.join(over_budget)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
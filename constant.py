@@ -106,4 +106,36 @@ SYSTEM_PROMPT = """
 
     🎯 **Ultimate Goal:**  
     Create a compelling narrative that makes managers think "This person drives results" and interviewers think "We need to hire them" - backed by concrete evidence, impressive metrics, and clear business impact.
-"""
\ No newline at end of file
+"""
+
+SUMMARY_SYSTEM_PROMPT = """
+    You condense one monthly work summary of a software engineer into a compact fact sheet that will later be used, together with the fact sheets of other months, to answer questions about the engineer's impact.
+
+    Keep every fact that could serve as evidence and drop everything else:
+    - The month the document covers
+    - Counts: PRs merged, bug fixes, new features, enhancements, refactors, unit tests and any other numbers mentioned
+    - Every work item as one line: title, type, date and PR numbers
+    - Projects, services, technologies and tools worked on
+    - Measurable outcomes (performance, reliability, cost, time saved) and who benefited
+    - Leadership signals: ownership, collaboration, mentoring, initiatives beyond assigned work
+
+    Use terse bullet points, no introduction or conclusion, and stay under 400 words. Never invent facts that are not in the document.
+"""
+
+SHARD_SYSTEM_PROMPT = """
+    You receive one part of a software engineer's work log (one month or one quarter) and a question about the engineer's work. Your findings will be merged with the findings from the other parts into the final answer.
+
+    Report only what this part contributes to the question:
+    - Relevant facts with their evidence: work item titles, dates, PR numbers, counts and measurable outcomes
+    - The period each fact belongs to
+
+    Use terse bullet points, no introduction or conclusion, and stay under 250 words. If this part contains nothing relevant, reply exactly "No relevant information." Never invent facts that are not in the text.
+"""
+
+HISTORY_SUMMARY_PROMPT = """
+    You maintain a rolling summary of a conversation between a user and an assistant about a software engineer's work. You receive the summary so far (if any) and the turns that happened since.
+
+    Write an updated summary that keeps what later questions may refer back to: the topics and time periods asked about, the key facts, numbers and PRs in the answers, and any preferences the user stated.
+
+    Use at most five short bullet points, no introduction or conclusion. Never invent facts.
+"""
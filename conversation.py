@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from constant import HISTORY_SUMMARY_PROMPT
+from llm_client import ask_llm
+from token_counter import count_tokens, truncate_to_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum tokens of earlier conversation included with a follow-up question
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Part of that budget reserved for the rolling summary of turns too old to include verbatim
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Rolling summaries by hash of the turns they cover
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+_SUMMARY_CACHE_SIZE = 256
+
+def _turns(history):
+    """
+    Pairs chat messages ({"role", "content"}) into (question, answer) turns.
+    Non-text messages are skipped; a question without an answer gets "".
+    """
+    turns = []
+    for message in history or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if not isinstance(content, str) or not content.strip():
+            continue
+        if message.get("role") == "user":
+            turns.append([content.strip(), ""])
+        elif message.get("role") == "assistant" and turns and not turns[-1][1]:
+            turns[-1][1] = content.strip()
+    return [tuple(turn) for turn in turns]
+
+def _format_turn(turn):
+    question, answer = turn
+    return f"User: {question}\nAssistant: {answer}\n\n" if answer else f"User: {question}\n\n"
+
+def _turns_key(turns):
+    return hashlib.sha256("".join(_format_turn(turn) for turn in turns).encode("utf-8")).hexdigest()
+
+def _extractive_summary(turns):
+    return "Earlier questions: " + "; ".join(question for question, _ in turns)
+
+def _compact(turns):
+    """
+    Returns the rolling summary of turns. The summary of the longest already
+    summarized prefix is extended with the newer turns only, so each turn is
+    summarized once however long the conversation grows. Falls back to listing
+    the earlier questions when the LLM cannot be reached.
+    """
+    key = _turns_key(turns)
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+        previous, done = "", 0
+        for count in range(len(turns) - 1, 0, -1):
+            cached = _summaries.get(_turns_key(turns[:count]))
+            if cached is not None:
+                previous, done = cached, count
+                break
+
+    material = (f"SUMMARY SO FAR:\n{previous}\n\n" if previous else "") + "NEW TURNS:\n" + "".join(
+        _format_turn(turn) for turn in turns[done:]
+    )
+    try:
+        summary = ask_llm(system_prompt=HISTORY_SUMMARY_PROMPT, user_prompt=material)
+    except Exception as e:
+        logger.warning(f"Could not summarize the conversation ({e}), listing earlier questions instead")
+        return truncate_to_tokens(_extractive_summary(turns), HISTORY_SUMMARY_TOKENS)
+    summary = truncate_to_tokens(summary or _extractive_summary(turns), HISTORY_SUMMARY_TOKENS)
+
+    with _summaries_lock:
+        _summaries[key] = summary
+        while len(_summaries) > _SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return summary
+
+def history_key(history):
+    """
+    Returns a short hash of the conversation before the current question ("" without
+    history), for cache keys: the same follow-up after a different conversation
+    may need a different answer.
+    """
+    turns = _turns(history)
+    return _turns_key(turns)[:16] if turns else ""
+
+def previous_question(history):
+    """
+    Returns the latest question asked before the current one, or "".
+    """
+    turns = _turns(history)
+    return turns[-1][0] if turns else ""
+
+def build_conversation_context(history):
+    """
+    Returns the earlier conversation to send with a follow-up question, within
+    HISTORY_TOKEN_BUDGET: the most recent turns verbatim and, when older turns
+    don't fit, a rolling summary of those. Returns "" without history.
+    """
+    turns = _turns(history)
+    if not turns or HISTORY_TOKEN_BUDGET <= 0:
+        return ""
+
+    recent_budget = HISTORY_TOKEN_BUDGET - HISTORY_SUMMARY_TOKENS
+    recent = []
+    used = 0
+    for turn in reversed(turns):
+        text = _format_turn(turn)
+        tokens = count_tokens(text)
+        if used + tokens > recent_budget:
+            if not recent:
+                # Even the latest turn alone is too long: keep its beginning
+                recent.append(truncate_to_tokens(text, recent_budget) + "\n\n")
+            break
+        recent.insert(0, text)
+        used += tokens
+
+    older = turns[:len(turns) - len(recent)]
+    parts = ["="*80 + "\n" + "CONVERSATION SO FAR:\n" + "="*80 + "\n\n"]
+    if older:
+        parts.append(f"Summary of earlier turns: {_compact(older)}\n\n")
+    parts.extend(recent)
+    logger.info(f"Including {len(recent)} recent turns"
+                + (f" and a summary of {len(older)} earlier turns" if older else ""))
+    return "".join(parts)
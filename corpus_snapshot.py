@@ -0,0 +1,82 @@
+import hashlib
+import itertools
+import time
+from pathlib import Path
+from types import MappingProxyType
+
+from metrics_store import get_metrics_table
+from retrieval import get_index
+from temporal_index import get_temporal_index
+from token_counter import get_document_token_counts
+
+_generations = itertools.count(1)
+
+class CorpusSnapshot:
+    """
+    One immutable version of the loaded work documents. A reload builds a new
+    snapshot and publishes it by replacing a single reference, so a request that
+    took a snapshot at its start sees the same documents, hashes and version
+    until it ends, whatever reloads happen meanwhile.
+
+    documents: document name -> text (read-only mapping, in directory order)
+    hashes:    document name -> SHA-256 of the file's bytes
+    version:   short hash of the document names and contents; equal contents give
+               equal versions across processes, so caches (indexes, responses,
+               prompt blocks) use it as their key
+    generation: number of the snapshot within this process (1, 2, ...)
+    """
+
+    __slots__ = ("documents", "hashes", "version", "generation", "created")
+
+    def __init__(self, entries):
+        """
+        entries: absolute path -> {"size", "mtime_ns", "sha256", "text"}, as
+        built by a reload.
+        """
+        # Use filename without extension as the key
+        documents = {Path(key).stem: entry["text"] for key, entry in entries.items()}
+        hashes = {Path(key).stem: entry["sha256"] for key, entry in entries.items()}
+        set_attribute = object.__setattr__
+        set_attribute(self, "documents", MappingProxyType(documents))
+        set_attribute(self, "hashes", MappingProxyType(hashes))
+        set_attribute(self, "version", hashlib.sha256("\n".join(
+            f"{name}:{sha256}" for name, sha256 in hashes.items()
+        ).encode("utf-8")).hexdigest()[:16])
+        set_attribute(self, "generation", next(_generations))
+        set_attribute(self, "created", time.time())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CorpusSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CorpusSnapshot is immutable")
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __repr__(self):
+        return f"CorpusSnapshot(version={self.version!r}, generation={self.generation}, documents={len(self)})"
+
+    # Derived artifacts: built once per version and shared by every snapshot
+    # (and process-wide cache) with that version
+
+    def retrieval_index(self):
+        return get_index(self.documents, self.version)
+
+    def temporal_index(self):
+        return get_temporal_index(list(self.documents), self.version)
+
+    def metrics_table(self):
+        return get_metrics_table(self.documents, self.version)
+
+    def token_counts(self):
+        return get_document_token_counts(self.documents, self.version)
+
+    def build_indexes(self):
+        """
+        Builds every derived artifact now, e.g. before the snapshot is published.
+        """
+        self.retrieval_index()
+        self.temporal_index()
+        self.metrics_table()
+        self.token_counts()
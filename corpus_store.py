@@ -0,0 +1,169 @@
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the extracted text of every work_doc file, keyed by content hash.
+# Set CORPUS_STORE_PATH to an empty string to disable the on-disk store.
+CORPUS_STORE_PATH = os.getenv(
+    "CORPUS_STORE_PATH", str(Path(__file__).parent / ".cache" / "corpus.sqlite3")
+)
+
+_connection = None
+_lock = threading.Lock()
+
+def store_enabled():
+    """
+    Returns True when the on-disk corpus store is configured.
+    """
+    return bool(CORPUS_STORE_PATH)
+
+def _get_connection():
+    """
+    Opens (once) the SQLite connection and creates the schema if needed.
+    Must be called with _lock held.
+    """
+    global _connection
+
+    if _connection is None:
+        Path(CORPUS_STORE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(CORPUS_STORE_PATH, check_same_thread=False)
+        _connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS extracts (
+                sha256 TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (sha256, extractor)
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                sha256 TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (sha256, variant)
+            );
+        """)
+        logger.info(f"Opened corpus store at {CORPUS_STORE_PATH}")
+    return _connection
+
+def load_corpus(extractor):
+    """
+    Loads every stored file record that has extracted text for the given extractor.
+    Returns a dictionary of path -> {"size", "mtime_ns", "sha256", "text"}.
+    """
+    if not store_enabled():
+        return {}
+
+    try:
+        with _lock:
+            rows = _get_connection().execute(
+                "SELECT f.path, f.size, f.mtime_ns, f.sha256, e.text "
+                "FROM files f JOIN extracts e ON e.sha256 = f.sha256 AND e.extractor = ?",
+                (extractor,),
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Error loading corpus store: {e}")
+        return {}
+
+    return {
+        path: {"size": size, "mtime_ns": mtime_ns, "sha256": sha256, "text": text}
+        for path, size, mtime_ns, sha256, text in rows
+    }
+
+def load_text(sha256, extractor):
+    """
+    Returns the stored text for a content hash, or None if it was never extracted.
+    """
+    if not store_enabled():
+        return None
+
+    try:
+        with _lock:
+            row = _get_connection().execute(
+                "SELECT text FROM extracts WHERE sha256 = ? AND extractor = ?",
+                (sha256, extractor),
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading corpus store: {e}")
+        return None
+
+    return row[0] if row else None
+
+def save_corpus(entries, extractor):
+    """
+    Persists the current file records and their extracted text, and drops records
+    for files that no longer exist along with text and summaries no file refers to
+    anymore.
+    entries is a dictionary of path -> {"size", "mtime_ns", "sha256", "text"}.
+    """
+    if not store_enabled():
+        return
+
+    try:
+        with _lock:
+            connection = _get_connection()
+            with connection:
+                connection.execute("DELETE FROM files")
+                connection.executemany(
+                    "INSERT INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                    [(path, e["size"], e["mtime_ns"], e["sha256"]) for path, e in entries.items()],
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO extracts (sha256, extractor, text) VALUES (?, ?, ?)",
+                    [(e["sha256"], extractor, e["text"]) for e in entries.values()],
+                )
+                connection.execute(
+                    "DELETE FROM extracts WHERE sha256 NOT IN (SELECT sha256 FROM files)"
+                )
+                connection.execute(
+                    "DELETE FROM summaries WHERE sha256 NOT IN (SELECT sha256 FROM files)"
+                )
+    except sqlite3.Error as e:
+        logger.error(f"Error writing corpus store: {e}")
+
+def load_summary(sha256, variant):
+    """
+    Returns the stored summary of a file's content, or None if none was stored.
+    variant identifies how the summary was produced (prompt, model, extractor).
+    """
+    if not store_enabled():
+        return None
+
+    try:
+        with _lock:
+            row = _get_connection().execute(
+                "SELECT text FROM summaries WHERE sha256 = ? AND variant = ?",
+                (sha256, variant),
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading corpus store: {e}")
+        return None
+
+    return row[0] if row else None
+
+def save_summary(sha256, variant, text):
+    """
+    Persists the summary of a file's content.
+    """
+    if not store_enabled():
+        return
+
+    try:
+        with _lock:
+            with _get_connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO summaries (sha256, variant, text) VALUES (?, ?, ?)",
+                    (sha256, variant, text),
+                )
+    except sqlite3.Error as e:
+        logger.error(f"Error writing corpus store: {e}")
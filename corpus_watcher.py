@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from work_impact_agent import WORK_DOC_DIR, read_docx_files_from_work_doc, set_corpus_watched
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How work_doc is watched: "auto" (inotify on Linux, else polling), "inotify", "poll" or "off"
+CORPUS_WATCH = os.getenv("CORPUS_WATCH", "auto")
+# Seconds between directory scans when polling
+CORPUS_POLL_INTERVAL = float(os.getenv("CORPUS_POLL_INTERVAL", "2"))
+# Seconds without further changes before reloading (a file copy fires many events)
+CORPUS_WATCH_DEBOUNCE = float(os.getenv("CORPUS_WATCH_DEBOUNCE", "0.5"))
+
+# inotify event masks (see <sys/inotify.h>)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+               | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def _is_document(name):
+    # Word's "~$name.docx" lock files come and go while a document is open
+    return name.endswith(".docx") and not name.startswith("~$")
+
+class _Inotify:
+    """
+    Minimal inotify binding through ctypes (Linux only): watches one directory
+    and reports whether any .docx file in it changed.
+    """
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout):
+        """
+        Waits up to timeout seconds for events. Returns "changed" when a document
+        changed, "gone" when the directory itself was removed or moved, else None.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return None
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return None
+        result = None
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += _EVENT_HEADER.size + length
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                return "gone"
+            if mask & _IN_Q_OVERFLOW or _is_document(os.fsdecode(name)):
+                result = "changed"
+        return result
+
+    def close(self):
+        os.close(self._fd)
+
+def _scan(path):
+    """
+    Returns {file name: (size, mtime_ns)} for the documents in path ({} if missing).
+    """
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                    for entry in entries if _is_document(entry.name) and entry.is_file()}
+    except FileNotFoundError:
+        return {}
+
+class CorpusWatcher:
+    """
+    Background thread that watches work_doc and reloads the corpus when
+    documents are added, changed or removed. The reload, including parsing and
+    building the indexes, happens in this thread; the new corpus replaces the
+    old one only once it is ready, so requests never wait for ingestion.
+    on_reload, when given, is called after every successful reload.
+    """
+
+    def __init__(self, path=WORK_DOC_DIR, mode=CORPUS_WATCH, on_reload=None):
+        self.path = str(path)
+        self.mode = mode
+        self.on_reload = on_reload
+        self.backend = None
+        self.reloads = 0
+        self.last_reload = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="corpus-watcher", daemon=True)
+        self._thread.start()
+        set_corpus_watched(True)
+
+    def stop(self):
+        set_corpus_watched(False)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _reload(self):
+        started = time.perf_counter()
+        try:
+            read_docx_files_from_work_doc(prebuild_indexes=True)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Corpus reload failed: {e}")
+            return
+        self.reloads += 1
+        self.last_reload = time.time()
+        logger.info(f"Corpus reloaded in the background in {time.perf_counter() - started:.2f}s")
+        if self.on_reload is not None:
+            try:
+                self.on_reload()
+            except Exception as e:
+                logger.error(f"Error after corpus reload: {e}")
+
+    def _open_inotify(self):
+        if self.mode not in ("auto", "inotify"):
+            return None
+        if not sys.platform.startswith("linux"):
+            if self.mode == "inotify":
+                logger.warning("inotify is only available on Linux, polling instead")
+            return None
+        try:
+            return _Inotify(self.path)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Cannot watch {self.path} with inotify ({e}), polling instead")
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Put the watch in place (or take the polling baseline) before
+            # reloading, so a change made during the reload is still seen
+            inotify = self._open_inotify()
+            self.backend = "inotify" if inotify else "poll"
+            baseline = None if inotify else _scan(self.path)
+            logger.info(f"Watching {self.path} for document changes ({self.backend})")
+            try:
+                # Catch changes made before the watch was in place
+                self._reload()
+                if inotify:
+                    self._watch_inotify(inotify)
+                else:
+                    self._watch_poll(baseline)
+            except Exception as e:
+                logger.error(f"Corpus watcher error: {e}")
+                self._stop.wait(CORPUS_POLL_INTERVAL)
+            finally:
+                if inotify:
+                    inotify.close()
+
+    def _watch_inotify(self, inotify):
+        while not self._stop.is_set():
+            event = inotify.wait(1.0)
+            if event == "gone":
+                # The directory was replaced: watch the new one (and reload)
+                self._stop.wait(CORPUS_WATCH_DEBOUNCE)
+                return
+            if event == "changed":
+                # Wait for the burst of events to settle
+                while inotify.wait(CORPUS_WATCH_DEBOUNCE) is not None:
+                    pass
+                self._reload()
+
+    def _watch_poll(self, snapshot):
+        missing = not os.path.isdir(self.path)
+        while not self._stop.wait(CORPUS_POLL_INTERVAL):
+            current = _scan(self.path)
+            if current != snapshot:
+                # Reload once the files stop changing
+                while True:
+                    self._stop.wait(CORPUS_WATCH_DEBOUNCE)
+                    settled = _scan(self.path)
+                    if settled == current:
+                        break
+                    current = settled
+                self._reload()
+                snapshot = current
+            if missing and os.path.isdir(self.path):
+                # The directory appeared: watch it with inotify when available
+                return
+
+    def status(self):
+        return {
+            "backend": self.backend,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+def start_watcher(on_reload=None):
+    """
+    Starts the corpus watcher (once per process) unless CORPUS_WATCH is "off".
+    on_reload is called after each successful background reload. Returns the
+    watcher, or None when disabled.
+    """
+    global _watcher
+
+    if CORPUS_WATCH == "off":
+        return None
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = CorpusWatcher(on_reload=on_reload)
+            _watcher.start()
+        return _watcher
+
+def stop_watcher():
+    """
+    Stops the corpus watcher; requests check work_doc themselves again.
+    """
+    global _watcher
+
+    with _watcher_lock:
+        if _watcher is not None:
+            _watcher.stop()
+            _watcher = None
+
+def get_watcher_status():
+    """
+    Returns the watcher's backend ("inotify" or "poll"), whether it runs, how
+    many background reloads it made and the last error, or None when not started.
+    """
+    with _watcher_lock:
+        return _watcher.status() if _watcher is not None else None
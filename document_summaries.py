@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from constant import SUMMARY_SYSTEM_PROMPT
+from corpus_store import load_summary, save_summary
+from docx_text import DOCX_EXTRACTOR
+from llm_client import DEFAULT_MODEL, ask_llm
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of document summaries generated at the same time
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# Summaries by (content hash, variant); backed by the corpus store
+_summaries = {}
+_lock = threading.Lock()
+# One lock per summary being generated, so concurrent requests don't summarize the same document twice
+_pending = {}
+
+def summary_variant():
+    """
+    Identifies how summaries are produced: the summary prompt, the model and the
+    text extractor. Changing any of them regenerates every summary.
+    """
+    material = "\x1f".join([SUMMARY_SYSTEM_PROMPT, DEFAULT_MODEL, DOCX_EXTRACTOR])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+def _summarize(name, sha256, text, variant):
+    key = (sha256, variant)
+    with _lock:
+        if key in _summaries:
+            return _summaries[key]
+        pending = _pending.setdefault(key, threading.Lock())
+
+    with pending:
+        with _lock:
+            if key in _summaries:
+                return _summaries[key]
+
+        summary = load_summary(sha256, variant)
+        if summary is None:
+            logger.info(f"Summarizing {name}")
+            summary = ask_llm(
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                user_prompt=f"📄 **{name}**\n{'-'*50}\n{text}",
+            )
+            if not summary:
+                raise ValueError(f"Empty summary for {name}")
+            save_summary(sha256, variant, summary)
+
+        with _lock:
+            _summaries[key] = summary
+            _pending.pop(key, None)
+        return summary
+
+def get_document_summaries(documents, concurrency=None):
+    """
+    Returns the fact-sheet summary of each document: document name -> summary.
+    documents is a list of (name, sha256, text). Summaries are generated once per
+    document content and stored, so only new or changed documents are sent to the
+    LLM (in parallel, up to SUMMARY_CONCURRENCY at a time). Raises an LLMError when
+    a summary cannot be generated.
+    """
+    variant = summary_variant()
+    with _lock:
+        missing = [(name, sha256, text) for name, sha256, text in documents
+                   if (sha256, variant) not in _summaries]
+
+    if missing:
+        workers = max(1, min(concurrency or SUMMARY_CONCURRENCY, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary") as executor:
+            list(executor.map(lambda document: _summarize(*document, variant), missing))
+        logger.info(f"Summaries ready for {len(documents)} documents ({len(missing)} loaded or generated)")
+
+    with _lock:
+        return {name: _summaries[(sha256, variant)] for name, sha256, _ in documents}
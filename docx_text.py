@@ -0,0 +1,258 @@
+import logging
+import multiprocessing
+import os
+import posixpath
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from lxml import etree
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of worker processes used to parse .docx files: 1 (default) parses
+# sequentially, 0 means one per CPU this process may run on. Each spawned worker
+# re-imports the main module, so the pool is opt-in and never used by the web UI.
+DOCX_WORKERS = int(os.getenv("DOCX_WORKERS", "1"))
+
+# How text is pulled out of a .docx file:
+#   "python-docx"   - full python-docx object model (default)
+#   "stream"        - stream-parse word/document.xml, same text as "python-docx"
+#   "stream-tables" - like "stream", plus the paragraphs inside table cells
+DOCX_EXTRACTOR = os.getenv("DOCX_EXTRACTOR", "python-docx")
+
+EXTRACTORS = ("python-docx", "stream", "stream-tables")
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BODY = _W + "body"
+_P = _W + "p"
+_TBL = _W + "tbl"
+_TC = _W + "tc"
+_R = _W + "r"
+_HYPERLINK = _W + "hyperlink"
+_T = _W + "t"
+_BR = _W + "br"
+_BR_TYPE = _W + "type"
+# Run children that map to a fixed character, as in python-docx
+_RUN_CHARS = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+_RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+# Below this many bytes of .docx files the process pool costs more than it saves.
+# Starting a spawn pool and importing the extractor in it takes about 0.45 s;
+# python-docx parses about 5 MB/s and the stream extractors about 60 MB/s, so
+# two workers only win beyond roughly 5 MB and 50 MB respectively.
+_PARALLEL_MIN_BYTES = {
+    "python-docx": 8 * 1024 * 1024,
+    "stream": 64 * 1024 * 1024,
+    "stream-tables": 64 * 1024 * 1024,
+}
+# Main modules that must not be re-imported by worker processes (gradio, FastAPI
+# and uvicorn take seconds and over 100 MB per worker)
+_WEB_UI_MAINS = ("gradio_advanced_ui", "gradio_ui", "launcher")
+
+def extract_docx_text(file_path, extractor=None):
+    """
+    Extracts the non-empty paragraph text of a single .docx file, one paragraph per line.
+    The extractor defaults to DOCX_EXTRACTOR.
+    """
+    extractor = extractor or DOCX_EXTRACTOR
+    if extractor == "stream":
+        return stream_docx_text(file_path)
+    if extractor == "stream-tables":
+        return stream_docx_text(file_path, include_tables=True)
+    if extractor != "python-docx":
+        raise ValueError(f"Unknown DOCX extractor: {extractor}")
+
+    # Imported here: python-docx is slow to import and the stream extractors don't need it
+    from docx import Document
+
+    doc = Document(file_path)
+
+    # Extract all text from paragraphs
+    text_content = []
+    for paragraph in doc.paragraphs:
+        if paragraph.text.strip():  # Only add non-empty paragraphs
+            text_content.append(paragraph.text.strip())
+
+    # Join all paragraphs with newlines
+    return "\n".join(text_content)
+
+def _run_text(run):
+    """
+    Text of a w:r element, translated the way python-docx's Run.text does.
+    """
+    parts = []
+    for child in run:
+        if child.tag == _T:
+            parts.append(child.text or "")
+        elif child.tag == _BR:
+            # Line breaks become newlines, page and column breaks are dropped
+            if child.get(_BR_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in _RUN_CHARS:
+            parts.append(_RUN_CHARS[child.tag])
+    return "".join(parts)
+
+def _paragraph_text(paragraph):
+    """
+    Text of a w:p element: its direct runs and the runs of its hyperlinks,
+    exactly the content python-docx's Paragraph.text includes.
+    """
+    parts = []
+    for child in paragraph:
+        if child.tag == _R:
+            parts.append(_run_text(child))
+        elif child.tag == _HYPERLINK:
+            parts.extend(_run_text(run) for run in child if run.tag == _R)
+    return "".join(parts)
+
+def _main_document_part(archive):
+    """
+    Resolves the main document part name from the package relationships,
+    falling back to the conventional word/document.xml.
+    """
+    try:
+        rels = etree.fromstring(archive.read("_rels/.rels"))
+        for rel in rels.iter(_RELS_NS + "Relationship"):
+            if rel.get("Type") == _OFFICE_DOCUMENT_REL:
+                return posixpath.normpath(rel.get("Target").lstrip("/"))
+    except (KeyError, etree.XMLSyntaxError):
+        pass
+    return "word/document.xml"
+
+def iter_docx_paragraphs(file_path, include_tables=False):
+    """
+    Streams the paragraph text of a .docx file in document order without loading
+    the python-docx object model or any media parts. Only body paragraphs are
+    yielded unless include_tables is True, in which case table cell paragraphs
+    are yielded as well. Parsed elements are discarded as soon as they are read,
+    so memory stays bounded by the largest single paragraph or table.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(_main_document_part(archive)) as document_xml:
+            for _, element in etree.iterparse(document_xml, events=("end",), tag=(_P, _TBL)):
+                parent = element.getparent()
+                if element.tag == _P and (
+                    parent.tag == _BODY or (include_tables and parent.tag == _TC)
+                ):
+                    yield _paragraph_text(element)
+
+                # Free everything already read; nested paragraphs only need their own text
+                element.clear(keep_tail=True)
+                if parent.tag == _BODY:
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+def stream_docx_text(file_path, include_tables=False):
+    """
+    Extracts the non-empty paragraph text of a single .docx file, one paragraph per
+    line, by stream-parsing the main document XML.
+    """
+    return "\n".join(
+        text.strip() for text in iter_docx_paragraphs(file_path, include_tables)
+        if text.strip()
+    )
+
+def verify_extractors(file_paths, extractor="stream"):
+    """
+    Compares the given extractor against python-docx for each file.
+    Returns the list of file paths whose extracted text differs.
+    """
+    mismatches = []
+    for file_path in file_paths:
+        if extract_docx_text(file_path, extractor) != extract_docx_text(file_path, "python-docx"):
+            mismatches.append(file_path)
+    return mismatches
+
+def _extract_sequential(file_paths, extractor):
+    results = {}
+    for file_path in file_paths:
+        try:
+            results[file_path] = extract_docx_text(file_path, extractor)
+        except Exception as e:
+            results[file_path] = e
+    return results
+
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _main_module_name():
+    main = sys.modules.get("__main__")
+    spec = getattr(main, "__spec__", None)
+    if spec is not None:
+        return spec.name.rpartition(".")[2]
+    return os.path.splitext(os.path.basename(getattr(main, "__file__", "") or ""))[0]
+
+def _total_bytes(file_paths):
+    total = 0
+    for file_path in file_paths:
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass
+    return total
+
+def extract_many(file_paths, workers=None, extractor=None):
+    """
+    Extracts the text of several .docx files. With DOCX_WORKERS (or workers)
+    above 1 they are fanned out across a process pool, but only when there are
+    enough bytes to parse for it to pay off and the main module is not the web UI.
+    Returns a dictionary of file path -> text, in the order of file_paths. A file
+    that failed to parse maps to the exception raised for it, so one bad file
+    never affects the others.
+    """
+    file_paths = list(file_paths)
+    extractor = extractor or DOCX_EXTRACTOR
+    workers = DOCX_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = _available_cpus()
+    workers = min(workers, len(file_paths))
+
+    if workers <= 1 or _main_module_name() in _WEB_UI_MAINS:
+        return _extract_sequential(file_paths, extractor)
+    total_bytes = _total_bytes(file_paths)
+    if total_bytes < _PARALLEL_MIN_BYTES.get(extractor, 0):
+        return _extract_sequential(file_paths, extractor)
+
+    logger.info(f"Parsing {len(file_paths)} .docx files ({total_bytes / 1e6:.1f} MB) "
+                f"with {workers} worker processes")
+    try:
+        # spawn keeps workers independent of the threads running in this process
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {file_path: executor.submit(extract_docx_text, file_path, extractor)
+                       for file_path in file_paths}
+            results = {}
+            for file_path, future in futures.items():
+                try:
+                    results[file_path] = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    results[file_path] = e
+            return results
+    except (OSError, BrokenProcessPool) as e:
+        logger.warning(f"Process pool unavailable ({e}), parsing files sequentially")
+        return _extract_sequential(file_paths, extractor)
+
+if __name__ == "__main__":
+    # Usage: python docx_text.py [stream|stream-tables] [file.docx ...]
+    # Checks that the streaming extractor matches python-docx (defaults to work_doc/*.docx)
+    from pathlib import Path
+
+    args = sys.argv[1:]
+    extractor = args.pop(0) if args and args[0] in EXTRACTORS else "stream"
+    work_doc = os.getenv("WORK_DOC_DIR", str(Path(__file__).parent / "work_doc"))
+    paths = args or sorted(str(p) for p in Path(work_doc).glob("*.docx"))
+    mismatches = verify_extractors(paths, extractor)
+    for path in mismatches:
+        print(f"MISMATCH: {path}")
+    print(f"{len(paths) - len(mismatches)}/{len(paths)} files identical to python-docx ({extractor})")
+    sys.exit(1 if mismatches else 0)
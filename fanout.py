@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import LLMError, ask_llm, ask_llm_async, get_last_usage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of shard sub-queries sent at the same time
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+# How documents are split into shards: "document" (one per document) or "quarter"
+FANOUT_SHARD = os.getenv("FANOUT_SHARD", "document")
+
+def _result(label, started, answer=None, error=None):
+    usage = get_last_usage()
+    return {
+        "label": label,
+        "answer": answer,
+        "error": error,
+        "seconds": time.perf_counter() - started,
+        "tokens": usage["total_tokens"] if usage else 0,
+    }
+
+def _run_shard(system_prompt, label, user_prompt):
+    started = time.perf_counter()
+    try:
+        return _result(label, started, answer=ask_llm(system_prompt=system_prompt, user_prompt=user_prompt))
+    except LLMError as e:
+        return _result(label, started, error=e)
+
+async def _run_shard_async(system_prompt, label, user_prompt, semaphore):
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            answer = await ask_llm_async(system_prompt=system_prompt, user_prompt=user_prompt)
+            return _result(label, started, answer=answer)
+        except LLMError as e:
+            return _result(label, started, error=e)
+
+def _collect(results, started):
+    """
+    Turns shard results into {"findings": label -> answer, "tokens", "seconds",
+    "slowest"}. Raises the first shard error when no shard succeeded.
+    """
+    findings = {}
+    for result in results:
+        if result["error"] is not None:
+            logger.warning(f"Shard {result['label']} failed: {result['error']}")
+            findings[result["label"]] = "(No findings: this part could not be analyzed.)"
+        else:
+            findings[result["label"]] = result["answer"] or ""
+    if results and all(result["error"] is not None for result in results):
+        raise results[0]["error"]
+    return {
+        "findings": findings,
+        "tokens": sum(result["tokens"] for result in results),
+        "seconds": time.perf_counter() - started,
+        "slowest": max((result["seconds"] for result in results), default=0.0),
+    }
+
+def run_shards(system_prompt, shards, concurrency=None):
+    """
+    Sends every shard sub-query, at most concurrency (FANOUT_CONCURRENCY) at a
+    time. shards is a list of (label, user prompt). Returns the findings by
+    label, the tokens spent, the wall-clock seconds and the slowest shard's
+    seconds. Failed shards are reported as such in the findings; an LLMError is
+    raised only when every shard failed.
+    """
+    started = time.perf_counter()
+    workers = max(1, min(concurrency or FANOUT_CONCURRENCY, len(shards)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as executor:
+        results = list(executor.map(lambda shard: _run_shard(system_prompt, *shard), shards))
+    return _collect(results, started)
+
+async def run_shards_async(system_prompt, shards, concurrency=None):
+    """
+    Async variant of run_shards using the async client.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency or FANOUT_CONCURRENCY))
+    results = await asyncio.gather(*(
+        _run_shard_async(system_prompt, label, user_prompt, semaphore) for label, user_prompt in shards
+    ))
+    return _collect(list(results), started)
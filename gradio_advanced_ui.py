@@ -1,49 +1,191 @@
+import asyncio
 import gradio as gr
 import logging
-from work_impact_agent import work_impact_agent
+import os
+import time
+import uvicorn
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from llm_client import LLMError
+from telemetry import observe_stage, render_metrics
+from warmup import clean_example_prompt, get_readiness, start_warmup, warm_llm_connection
+from work_impact_agent import work_impact_agent_stream_async
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_chat_message(user_message, chat_history, progress=gr.Progress()):
+# Maximum number of chat requests processed at the same time; the rest wait in the queue
+GRADIO_CONCURRENCY_LIMIT = int(os.environ.get("GRADIO_CONCURRENCY_LIMIT", 32))
+# Maximum number of requests waiting in the queue before new ones are rejected
+GRADIO_MAX_QUEUE_SIZE = int(os.environ.get("GRADIO_MAX_QUEUE_SIZE", 128))
+
+# Text of the processing overlay as each stage of answering begins
+STAGE_STATUS = {
+    "corpus_load": "📂 Reading documents...",
+    "prompt_assembly": "🔎 Selecting relevant documents...",
+    "fanout": "🧩 Analyzing each part of your documents...",
+    "llm_total": "🤖 Analyzing Sahil's work portfolio...",
+}
+
+# Sidebar example prompts; their answers are pre-warmed in the background at startup
+EXAMPLE_PROMPTS = [
+    "📊 Provide a leadership summary of Sahil's work",
+    "🎯 What are Sahil's key achievements and impact?",
+    "📋 Summarize Sahil's contributions to projects",
+    "🔧 What skills and expertise does Sahil demonstrate?",
+    "⭐ Create Sahil's performance review summary",
+    "🆕 How many new features added in last three months?",
+    "📈 Analyze Sahil's work themes and focus areas",
+    "🚀 Highlight Sahil's most impactful contributions",
+    "💼 Extract Sahil's career development insights",
+    "🆕 How many PRs merged in October 2025?",
+    "🐛 How many bug fixes in month of September 2025?",
+    "📈 How many commits made in August 2025?",
+    "🔧 How many unit tests added this quarter?",
+    "⚡ How many performance improvements implemented?",
+    "🔄 How many process optimizations delivered in 2025?",
+    "📊 What's the total PR count for the year 2025?",
+    "🆕 What is Sahil's business impact and ROI?",
+    "👥 How does Sahil collaborate and lead teams?",
+    "🏆 What awards or recognitions has Sahil received?",
+    "📚 Show Sahil's learning and development activities",
+    "⚡ What innovations or improvements has Sahil driven?",
+    "🎖️ Demonstrate Sahil's problem-solving abilities",
+    "📊 What metrics show Sahil's performance excellence?",
+    "🌟 How has Sahil exceeded expectations?",
+    "🔄 Show Sahil's process improvements and optimizations",
+    "💡 What creative solutions has Sahil implemented?",
+    "📈 Track Sahil's career progression and growth",
+    "🎯 What goals has Sahil achieved or surpassed?",
+    "🤝 How does Sahil mentor and develop others?",
+    "🔍 Show Sahil's analytical and strategic thinking",
+    "⚙️ What technical expertise does Sahil possess?",
+    "🌐 How has Sahil contributed to organizational success?"
+]
+
+def processing_html(status):
+    """
+    Returns the processing overlay (spinner and status text) shown over the chat.
+    """
+    return f"""
+            <div class="processing-overlay">
+                <div class="spinner"></div>
+                <div class="processing-text">{status}</div>
+            </div>
+            """
+
+async def _answer_events(user_message, history, on_event):
+    """
+    Streams the agent's answer, reporting ("stage", name) as each stage begins,
+    ("delta", text) for each streamed piece and ("end", error or None) at the
+    end through on_event.
+    """
+    try:
+        async for delta in work_impact_agent_stream_async(
+            user_prompt=user_message, history=history, on_stage=lambda stage: on_event("stage", stage)
+        ):
+            on_event("delta", delta)
+    except Exception as e:
+        on_event("end", e)
+    else:
+        on_event("end", None)
+
+async def process_chat_message(user_message, chat_history, use_history=True):
     """
     Process chat message and update chat history using the new messages format.
+    This is an async generator of (chat history, input text, status): it yields
+    the status to show in the processing overlay as each stage of answering
+    begins, then the updated chat history (with a None status) each time more
+    of the assistant's answer has streamed in. With use_history, the earlier
+    turns are sent along so follow-up questions can refer to them.
     """
     try:
         if not user_message.strip():
-            return chat_history, "", gr.update(visible=True)
+            yield chat_history, "", None
+            return
         
-        progress(0.1, desc="Processing your message...")
+        # The conversation before this message, for follow-up questions
+        history = list(chat_history) if use_history else None
         
         # Add user message to chat history (new format)
         chat_history.append({"role": "user", "content": user_message})
         
-        progress(0.3, desc="Reading documents...")
-        progress(0.5, desc="Analyzing with AI...")
-        
-        # Call the work_impact_agent with the user's prompt
-        logger.info(f"Processing user message: {user_message[:100]}...")
-        response = work_impact_agent(user_prompt=user_message)
+        # Stages are reported from the worker thread preparing the request, so
+        # events reach this generator through a queue on the event loop
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
         
-        progress(0.9, desc="Formatting response...")
+        def on_event(kind, value):
+            loop.call_soon_threadsafe(events.put_nowait, (kind, value))
         
-        if response:
+        # Stream the work_impact_agent answer into the assistant message
+        logger.info(f"Processing user message: {user_message[:100]}...")
+        assistant_message = {"role": "assistant", "content": ""}
+        format_seconds = 0.0
+        answer = asyncio.create_task(_answer_events(user_message, history, on_event))
+        try:
+            while True:
+                kind, value = await events.get()
+                if kind == "end":
+                    if value is not None:
+                        raise value
+                    break
+                if kind == "stage":
+                    if value in STAGE_STATUS and not assistant_message["content"]:
+                        yield chat_history, "", STAGE_STATUS[value]
+                    continue
+                # Time the UI side of each update: extending the message and
+                # Gradio rendering and sending the chat before asking for more
+                started = time.perf_counter()
+                if not assistant_message["content"]:
+                    chat_history.append(assistant_message)
+                assistant_message["content"] += value
+                yield chat_history, "", None
+                format_seconds += time.perf_counter() - started
+        finally:
+            answer.cancel()
+        observe_stage("ui_format", format_seconds)
+        
+        if assistant_message["content"]:
             logger.info("Successfully received response from work_impact_agent")
-            # Add AI response to chat history
-            chat_history.append({"role": "assistant", "content": response})
-            progress(1.0, desc="Complete!")
         else:
             logger.warning("No response received from work_impact_agent")
             chat_history.append({"role": "assistant", "content": "Sorry, I couldn't process your request. Please check that you have .docx files in the work_doc directory and try again."})
         
-        return chat_history, "", gr.update(visible=True)  # Return updated chat, clear input, show chatbox
+        yield chat_history, "", None  # Return updated chat, clear input, hide overlay
+    
+    except LLMError as e:
+        logger.error(f"LLM call failed: {e}")
+        if chat_history and chat_history[-1]["role"] == "assistant" and chat_history[-1]["content"]:
+            # The answer was cut off mid-stream: keep what arrived and say so
+            chat_history[-1]["content"] += f"\n\n⚠️ {e.user_message}"
+        else:
+            chat_history.append({"role": "assistant", "content": f"⚠️ {e.user_message}"})
+        yield chat_history, "", None
     
     except Exception as e:
         error_msg = f"An error occurred while processing your request: {str(e)}"
         logger.error(error_msg)
         chat_history.append({"role": "assistant", "content": error_msg})
-        return chat_history, "", gr.update(visible=True)
+        yield chat_history, "", None
+
+async def _chat_updates(messages):
+    """
+    Turns the (chat history, input text, status) items of process_chat_message
+    into updates of the chatbot, the input and the processing overlay: the
+    overlay shows each stage until the answer starts streaming in.
+    """
+    async for chat_history, input_text, status in messages:
+        if status:
+            yield gr.update(), input_text, gr.update(value=processing_html(status), visible=True)
+        else:
+            yield (
+                gr.update(value=chat_history, elem_classes=["chat-messages"]),  # Remove blur from chatbot
+                input_text,
+                gr.update(value="", visible=False)  # Hide spinner
+            )
 
 def create_advanced_interface():
     """Create an advanced Gradio interface with top nav, left sidebar, and chat interface."""
@@ -816,40 +958,7 @@ def create_advanced_interface():
                 
                 # Example buttons
                 example_btns = []
-                example_prompts = [
-                    "📊 Provide a leadership summary of Sahil's work",
-                    "🎯 What are Sahil's key achievements and impact?",
-                    "📋 Summarize Sahil's contributions to projects",
-                    "🔧 What skills and expertise does Sahil demonstrate?",
-                    "⭐ Create Sahil's performance review summary",
-                    "🆕 How many new features added in last three months?",
-                    "📈 Analyze Sahil's work themes and focus areas",
-                    "🚀 Highlight Sahil's most impactful contributions",
-                    "💼 Extract Sahil's career development insights",
-                    "🆕 How many PRs merged in October 2025?",
-                    "🐛 How many bug fixes in month of September 2025?",
-                    "📈 How many commits made in August 2025?",
-                    "🔧 How many unit tests added this quarter?",
-                    "⚡ How many performance improvements implemented?",
-                    "🔄 How many process optimizations delivered in 2025?",
-                    "📊 What's the total PR count for the year 2025?",
-                    "🆕 What is Sahil's business impact and ROI?",
-                    "👥 How does Sahil collaborate and lead teams?",
-                    "🏆 What awards or recognitions has Sahil received?",
-                    "📚 Show Sahil's learning and development activities",
-                    "⚡ What innovations or improvements has Sahil driven?",
-                    "🎖️ Demonstrate Sahil's problem-solving abilities",
-                    "📊 What metrics show Sahil's performance excellence?",
-                    "🌟 How has Sahil exceeded expectations?",
-                    "🔄 Show Sahil's process improvements and optimizations",
-                    "💡 What creative solutions has Sahil implemented?",
-                    "📈 Track Sahil's career progression and growth",
-                    "🎯 What goals has Sahil achieved or surpassed?",
-                    "🤝 How does Sahil mentor and develop others?",
-                    "🔍 Show Sahil's analytical and strategic thinking",
-                    "⚙️ What technical expertise does Sahil possess?",
-                    "🌐 How has Sahil contributed to organizational success?"
-                ]
+                example_prompts = EXAMPLE_PROMPTS
                 
                 user_input = gr.Textbox(visible=False)  # Hidden textbox to store input
                 
@@ -919,26 +1028,16 @@ def create_advanced_interface():
         
         # Event handlers - Show spinner during processing
         def show_processing():
-            spinner_html = """
-            <div class="processing-overlay">
-                <div class="spinner"></div>
-                <div class="processing-text">🤖 Analyzing Sahil's work portfolio...</div>
-            </div>
-            """
             return (
                 gr.update(elem_classes=["chat-messages", "processing"]),  # Add blur to chatbot
-                gr.update(value=spinner_html, visible=True)  # Show spinner
+                gr.update(value=processing_html("🤖 Processing your message..."), visible=True)  # Show spinner
             )
         
-        def hide_processing_and_update(user_message, chat_history):
-            # Process the message
-            updated_chat, cleared_input, _ = process_chat_message(user_message, chat_history)
-            
-            return (
-                gr.update(value=updated_chat, elem_classes=["chat-messages"]),  # Remove blur from chatbot
-                cleared_input, 
-                gr.update(value="", visible=False)  # Hide spinner
-            )
+        async def hide_processing_and_update(user_message, chat_history):
+            # Process the message: the overlay follows the stages, then the answer
+            # streams into the chat as it arrives
+            async for update in _chat_updates(process_chat_message(user_message, chat_history)):
+                yield update
         
         submit_btn.click(
             fn=show_processing,
@@ -979,16 +1078,15 @@ def create_advanced_interface():
         
         # Connect example buttons to chat input
         def create_example_handler(prompt_text):
-            def handler_process_example(chat_history):
+            async def handler_process_example(chat_history):
                 # Remove the emoji and clean up the text
-                clean_prompt = prompt_text.split(' ', 1)[1] if ' ' in prompt_text else prompt_text
-                updated_chat, cleared_input, _ = process_chat_message(clean_prompt, chat_history)
-                
-                return (
-                    gr.update(value=updated_chat, elem_classes=["chat-messages"]),  # Remove blur
-                    cleared_input, 
-                    gr.update(value="", visible=False)  # Hide spinner
-                )
+                clean_prompt = clean_example_prompt(prompt_text)
+                # Example prompts are self-contained: asked without history they
+                # match the answers pre-warmed into the response cache
+                async for update in _chat_updates(
+                    process_chat_message(clean_prompt, chat_history, use_history=False)
+                ):
+                    yield update
             
             return handler_process_example
         
@@ -1006,24 +1104,81 @@ def create_advanced_interface():
                 show_progress=False
             )
     
+    # Bound how many LLM calls run at once and how many requests may wait
+    demo.queue(
+        default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT,
+        max_size=GRADIO_MAX_QUEUE_SIZE
+    )
+    
     return demo
 
- # Create the interface
-demo = create_advanced_interface()
+_demo = None
 
-if __name__ == "__main__":
-    import os
+def get_demo():
+    """
+    Returns the interface, building it on first use so importing this module
+    (e.g. in a multiprocessing worker) stays cheap.
+    """
+    global _demo
+    if _demo is None:
+        _demo = create_advanced_interface()
+    return _demo
+
+def __getattr__(name):
+    # gradio_advanced_ui.demo, built on first access (the `gradio` CLI looks it up)
+    if name == "demo":
+        return get_demo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_app(blocks):
+    """
+    Serves the Gradio interface from a FastAPI app that also exposes the
+    Prometheus metrics at /metrics, liveness at /healthz and readiness at
+    /readyz. Starting the app starts the warm-up pipeline; /readyz answers 503
+    until the corpus is loaded, its indexes are built and the LLM connection is
+    open, so no request lands on a cold instance.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        # Loads the corpus and answers the example prompts in the background so
+        # button clicks hit the cache
+        start_warmup(EXAMPLE_PROMPTS)
+        # The async client's connections belong to this event loop: open them here
+        connection = asyncio.create_task(warm_llm_connection())
+        yield
+        connection.cancel()
     
-    # Get port from environment variable (Render sets this) or default to 7860
-    port = int(os.environ.get("PORT", 7860))
+    app = FastAPI(lifespan=lifespan)
+    
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+    
+    @app.get("/healthz", include_in_schema=False)
+    def healthz():
+        return {"status": "ok"}
     
-    demo.launch(
-        share=False,  # Set to True if you want a public link
-        server_name="0.0.0.0",  # Bind to all interfaces for hosting platforms
-        server_port=port,  # Use port from environment or default
+    @app.get("/readyz", include_in_schema=False)
+    def readyz():
+        ready, steps = get_readiness()
+        return JSONResponse({"ready": ready, "steps": steps}, status_code=200 if ready else 503)
+    
+    return gr.mount_gradio_app(
+        app,
+        blocks,
+        path="/",
         show_error=True,
-        quiet=True,
         favicon_path=None,
         auth=None,  # Add authentication if needed: auth=("username", "password")
-        inbrowser=False  # Don't auto-open browser to avoid SSL issues
+    )
+
+if __name__ == "__main__":
+    # Get port from environment variable (Render sets this) or default to 7860
+    port = int(os.environ.get("PORT", 7860))
+    
+    uvicorn.run(
+        create_app(get_demo()),
+        host="0.0.0.0",  # Bind to all interfaces for hosting platforms
+        port=port,  # Use port from environment or default
+        log_level="warning",
     )
\ No newline at end of file
@@ -1,6 +1,11 @@
-from openai import AzureOpenAI
+import asyncio
+import contextvars
+import email.utils
 import os
 import logging
+import random
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -9,28 +14,345 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# --- Transport settings ---
+# Connections kept in the pool (and how many of them stay open between requests)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+# Seconds to establish a connection / to wait for response data
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+# Retries on 429, 5xx, timeouts and connection errors, with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Longest Retry-After (seconds) worth waiting for; a longer one fails the call at once
+LLM_RETRY_AFTER_MAX = float(os.getenv("LLM_RETRY_AFTER_MAX", "120"))
+# Ask streamed completions to report token usage in their last chunk
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"
+
 # --- Azure OpenAI Setup ---
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-    api_version=os.getenv("AZURE_OPENAI_VERSION"),
-)
+# The clients (and the openai / httpx packages, which take most of a second to
+# import) are created on first use, so importing this module is cheap
+_clients = {}  # "client" / "async_client" -> (SDK client, its httpx client)
+_clients_lock = threading.Lock()
+
+def _create_client(asynchronous):
+    import httpx
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=60,
+    )
+    timeout = httpx.Timeout(
+        connect=LLM_CONNECT_TIMEOUT,
+        read=LLM_READ_TIMEOUT,
+        write=LLM_CONNECT_TIMEOUT,
+        pool=LLM_CONNECT_TIMEOUT,
+    )
+    # Async client for the web app's event loop, so concurrent requests don't each hold a thread
+    client_class, http_client_class = (AsyncAzureOpenAI, httpx.AsyncClient) if asynchronous else (AzureOpenAI, httpx.Client)
+    http_client = http_client_class(limits=limits, timeout=timeout)
+    # Retries are handled here rather than by the SDK so Retry-After and the typed
+    # errors below apply uniformly
+    client = client_class(
+        api_key=os.getenv("AZURE_OPENAI_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        api_version=os.getenv("AZURE_OPENAI_VERSION"),
+        http_client=http_client,
+        timeout=timeout,
+        max_retries=0,
+    )
+    return client, http_client
+
+def get_client(asynchronous=False):
+    """
+    Returns the shared AzureOpenAI client (AsyncAzureOpenAI with asynchronous),
+    creating it on first use. Raises LLMRequestError when it cannot be created,
+    e.g. because the Azure OpenAI settings are missing.
+    """
+    return _get_clients(asynchronous)[0]
+
+def _get_clients(asynchronous):
+    name = "async_client" if asynchronous else "client"
+    clients = _clients.get(name)
+    if clients is None:
+        with _clients_lock:
+            clients = _clients.get(name)
+            if clients is None:
+                try:
+                    clients = _clients[name] = _create_client(asynchronous)
+                except Exception as e:
+                    raise LLMRequestError(f"Could not create the Azure OpenAI client: {e}") from e
+                logger.info(f"Azure OpenAI {'async ' if asynchronous else ''}client initialized successfully.")
+    return clients
+
+def warm_connection():
+    """
+    Creates the client and opens a pooled connection to the Azure OpenAI
+    endpoint (DNS, TCP and TLS), so the first real call doesn't pay for it.
+    Costs no tokens. Returns True when the endpoint answered.
+    """
+    try:
+        _, http_client = _get_clients(asynchronous=False)
+        http_client.get(os.getenv("AZURE_OPENAI_ENDPOINT"))
+        return True
+    except Exception as e:
+        logger.warning(f"Could not open a connection to Azure OpenAI: {e}")
+        return False
+
+async def warm_connection_async():
+    """
+    Async variant of warm_connection for the async client. Must run on the
+    event loop that will use the client, as its connections belong to that loop.
+    """
+    try:
+        _, http_client = _get_clients(asynchronous=True)
+        await http_client.get(os.getenv("AZURE_OPENAI_ENDPOINT"))
+        return True
+    except Exception as e:
+        logger.warning(f"Could not open a connection to Azure OpenAI: {e}")
+        return False
+
+def __getattr__(name):
+    # llm_client.client / llm_client.async_client, created on first access
+    if name in ("client", "async_client"):
+        return get_client(asynchronous=name == "async_client")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Token usage of the latest LLM call made in the current thread / async task
+_last_usage = contextvars.ContextVar("last_usage", default=None)
+
+class LLMError(Exception):
+    """
+    Base class for LLM call failures. user_message is safe to show in the UI.
+    """
+    user_message = "The AI service could not complete your request. Please try again."
+
+class LLMRateLimitError(LLMError):
+    user_message = "The AI service is receiving too many requests right now. Please try again in a minute."
+
+class LLMTimeoutError(LLMError):
+    user_message = "The AI service took too long to respond. Please try again."
+
+class LLMUnavailableError(LLMError):
+    user_message = "The AI service is temporarily unavailable. Please try again shortly."
+
+class LLMRequestError(LLMError):
+    user_message = "The AI service rejected the request. Please check the Azure OpenAI configuration."
+
+def _is_retryable(error):
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
 
-logger.info("Azure OpenAI client initialized successfully.")
+def _translate_error(error):
+    """
+    Maps an OpenAI SDK exception to the matching LLMError subclass.
+    """
+    if isinstance(error, LLMError):
+        return error
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 
-def ask_llm(system_prompt: str, user_prompt: str, model: str = "gpt-4o") -> str:
+    if isinstance(error, RateLimitError):
+        return LLMRateLimitError(str(error))
+    if isinstance(error, APITimeoutError):
+        return LLMTimeoutError(str(error))
+    if isinstance(error, APIConnectionError):
+        return LLMUnavailableError(str(error))
+    if isinstance(error, APIStatusError):
+        if error.status_code >= 500:
+            return LLMUnavailableError(str(error))
+        return LLMRequestError(str(error))
+    return LLMError(str(error))
+
+def _retry_after(error):
+    """
+    Returns the delay the service asked for (retry-after-ms / Retry-After), or None.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                retry_at = email.utils.parsedate_to_datetime(value)
+                return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def _backoff_delay(attempt, error):
+    """
+    Full-jitter exponential backoff, never shorter than what Retry-After asks for.
+    Returns None when the call should not be retried: the error is not transient,
+    the retries are used up, or Retry-After is longer than LLM_RETRY_AFTER_MAX.
+    """
+    if not _is_retryable(error) or attempt >= LLM_MAX_RETRIES:
+        return None
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        if retry_after > LLM_RETRY_AFTER_MAX:
+            logger.warning(f"Azure OpenAI asked to retry after {retry_after:.0f}s, giving up")
+            return None
+        delay = max(delay, retry_after)
+    return delay
+
+def _call_with_retries(call):
+    """
+    Runs call(), retrying transient failures. Raises an LLMError when it gives up.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return call()
+        except Exception as e:
+            delay = _backoff_delay(attempt, e)
+            if delay is None:
+                raise _translate_error(e) from e
+            logger.warning(f"Azure OpenAI call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+async def _call_with_retries_async(call):
+    """
+    Async variant of _call_with_retries; call() returns an awaitable.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except Exception as e:
+            delay = _backoff_delay(attempt, e)
+            if delay is None:
+                raise _translate_error(e) from e
+            logger.warning(f"Azure OpenAI call failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def _record_usage(usage):
+    """
+    Logs a response's token usage and remembers it for get_last_usage().
+    """
+    if usage is None:
+        _last_usage.set(None)
+        return
+    recorded = {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+    _last_usage.set(recorded)
+    logger.info(f"Token usage: {recorded['prompt_tokens']} prompt + "
+                f"{recorded['completion_tokens']} completion = {recorded['total_tokens']} total")
+
+def get_last_usage():
+    """
+    Returns the token usage ({"prompt_tokens", "completion_tokens", "total_tokens"})
+    reported for the latest LLM call made in the current thread or async task,
+    or None if the service reported none.
+    """
+    return _last_usage.get()
+
+def _stream_kwargs():
+    return {"stream": True, "stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {"stream": True}
+
+def _messages(system_prompt, user_prompt):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def ask_llm(system_prompt: str, user_prompt: str, model: str = DEFAULT_MODEL) -> str:
+    """
+    Sends one chat completion request. Raises an LLMError subclass on failure.
+    """
     logger.info("Sending request to Azure OpenAI...")
+    _last_usage.set(None)
     try:
-        response = client.chat.completions.create(
+        response = _call_with_retries(lambda: get_client().chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        logger.info("Received response from Azure OpenAI.")
-        return response.choices[0].message.content
+            messages=_messages(system_prompt, user_prompt)
+        ))
+    except LLMError as e:
+        logger.error(f"Error occurred while calling Azure OpenAI: {e}")
+        raise
+    logger.info("Received response from Azure OpenAI.")
+    _record_usage(response.usage)
+    return response.choices[0].message.content
+
+def ask_llm_stream(system_prompt: str, user_prompt: str, model: str = DEFAULT_MODEL):
+    """
+    Streams the completion: a generator yielding text deltas as they arrive.
+    Only opening the stream is retried; a failure mid-stream raises an LLMError.
+    """
+    logger.info("Sending streaming request to Azure OpenAI...")
+    _last_usage.set(None)
+    try:
+        stream = _call_with_retries(lambda: get_client().chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_prompt),
+            **_stream_kwargs()
+        ))
+        usage = None
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     except Exception as e:
+        logger.error(f"Error occurred while streaming from Azure OpenAI: {e}")
+        raise _translate_error(e) from e
+    logger.info("Finished streaming response from Azure OpenAI.")
+    _record_usage(usage)
+
+async def ask_llm_async(system_prompt: str, user_prompt: str, model: str = DEFAULT_MODEL) -> str:
+    """
+    Async variant of ask_llm using the AsyncAzureOpenAI client.
+    """
+    logger.info("Sending async request to Azure OpenAI...")
+    _last_usage.set(None)
+    try:
+        response = await _call_with_retries_async(lambda: get_client(asynchronous=True).chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_prompt)
+        ))
+    except LLMError as e:
         logger.error(f"Error occurred while calling Azure OpenAI: {e}")
-        return None
\ No newline at end of file
+        raise
+    logger.info("Received response from Azure OpenAI.")
+    _record_usage(response.usage)
+    return response.choices[0].message.content
+
+async def ask_llm_stream_async(system_prompt: str, user_prompt: str, model: str = DEFAULT_MODEL):
+    """
+    Async variant of ask_llm_stream: an async generator yielding text deltas.
+    """
+    logger.info("Sending async streaming request to Azure OpenAI...")
+    _last_usage.set(None)
+    try:
+        stream = await _call_with_retries_async(lambda: get_client(asynchronous=True).chat.completions.create(
+            model=model,
+            messages=_messages(system_prompt, user_prompt),
+            **_stream_kwargs()
+        ))
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.error(f"Error occurred while streaming from Azure OpenAI: {e}")
+        raise _translate_error(e) from e
+    logger.info("Finished streaming response from Azure OpenAI.")
+    _record_usage(usage)
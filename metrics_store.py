@@ -0,0 +1,190 @@
+import logging
+import re
+from datetime import date
+
+from temporal_index import documents_in_range, get_temporal_index, question_date_range
+from versioned_cache import VersionedCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Metrics that can be answered from the table: key -> (singular, plural, question pattern)
+METRICS = {
+    "prs": ("PR", "PRs", r"\b(?:prs?|pull[\s-]requests?)\b"),
+    "bug_fixes": ("bug fix", "bug fixes", r"\bbug[\s-]?fix(?:es)?\b|\bbugs?\s+fixed\b"),
+    "new_features": ("new feature", "new features", r"\b(?:new\s+)?features?\b"),
+    "enhancements": ("enhancement", "enhancements", r"\benhancements?\b"),
+    "refactors": ("refactor", "refactors", r"\brefactor(?:s|ings?)?\b"),
+    "performance_improvements": ("performance improvement", "performance improvements",
+                                 r"\bperformance\s+improvements?\b"),
+    "ui_improvements": ("UI improvement", "UI improvements", r"\bui\s+improvements?\b"),
+}
+
+# Work item "Type:" values -> metric key
+_TYPE_METRICS = {
+    "bug fix": "bug_fixes",
+    "new feature": "new_features",
+    "enhancement": "enhancements",
+    "refactor": "refactors",
+    "performance improvement": "performance_improvements",
+    "ui improvement": "ui_improvements",
+}
+
+_FIELD_RE = re.compile(r"^(Type|Date|PR link)\s*:\s*(.*)$")
+_PR_NUMBER_RE = re.compile(r"\b(?:Merged PR|Pull request)\s+(\d+)", re.IGNORECASE)
+_COUNT_QUESTION_RE = re.compile(r"\b(?:how many|number of|count|total)\b")
+
+# Words a count question may contain besides the metric and the time range.
+# Anything else (e.g. "related to Kusto") means the table cannot answer it.
+_FILLER_WORDS = frozenset("""
+    how many number of count total what what's s is was were the a did has have had sahil sahil's
+    his he i my me we our made merged added implemented delivered submitted created fixed
+    raised opened done completed shipped in on for during over across within by from to
+    and between month months year years quarter quarters this last past previous current
+    recent so far overall all there been month's year's
+""".split())
+_TEMPORAL_WORDS = frozenset("""
+    january february march april may june july august september october november december
+    jan feb mar apr jun jul aug sep sept oct nov dec one two three four five six seven eight
+    nine ten eleven twelve first second third fourth half
+""".split())
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Metrics tables of the current corpus version and the one being swapped in
+_tables = VersionedCache()
+
+def _item_metric(item_type):
+    normalized = item_type.strip().lower()
+    for prefix, metric in _TYPE_METRICS.items():
+        if normalized.startswith(prefix):
+            return metric
+    return None
+
+def extract_document_metrics(text):
+    """
+    Pulls the work items out of one monthly document. A work item is a title line
+    followed by "Type:", "Date:" and "PR link:" fields.
+    Returns {"items": [...], "counts": {metric: count}} where each item is a
+    dictionary with "title", "type", "date" and "prs" (list of PR numbers).
+    """
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    items = []
+    current = None
+
+    for i, line in enumerate(lines):
+        match = _FIELD_RE.match(line)
+        if not match:
+            continue
+        field, value = match.group(1), match.group(2).strip()
+        if field == "Type":
+            current = {"title": lines[i - 1] if i > 0 else "", "type": value, "date": "", "prs": []}
+            items.append(current)
+        elif field == "Date" and current is not None:
+            current["date"] = value
+        elif field == "PR link" and current is not None:
+            current["prs"].extend(number for number in _PR_NUMBER_RE.findall(value)
+                                  if number not in current["prs"])
+
+    counts = {metric: 0 for metric in METRICS}
+    counts["prs"] = len({number for item in items for number in item["prs"]})
+    for item in items:
+        metric = _item_metric(item["type"])
+        if metric:
+            counts[metric] += 1
+
+    return {"items": items, "counts": counts}
+
+def get_metrics_table(files_dict, corpus_version):
+    """
+    Returns the metrics table: document name -> extract_document_metrics() result.
+    Built once per corpus version.
+    """
+    def build():
+        table = {name: extract_document_metrics(text) for name, text in files_dict.items()}
+        logger.info(f"Built metrics table for {len(table)} documents")
+        return table
+
+    return _tables.get(corpus_version, build)
+
+def _recognize_metric(text):
+    """
+    Returns the metric a count question asks about, or None if it is not a plain
+    count question the table can answer.
+    """
+    if not _COUNT_QUESTION_RE.search(text):
+        return None
+
+    matches = [metric for metric, (_, _, pattern) in METRICS.items() if re.search(pattern, text)]
+    if len(matches) != 1:
+        return None
+    metric = matches[0]
+
+    # Strip the metric and anything temporal, then make sure nothing else is asked
+    remainder = re.sub(METRICS[metric][2], " ", text)
+    remainder = re.sub(r"\b(?:19|20)\d{2}\b|\bq[1-4]\b|\bh[12]\b", " ", remainder)
+    for word in _WORD_RE.findall(remainder):
+        if word not in _FILLER_WORDS and word not in _TEMPORAL_WORDS and not word.isdigit():
+            return None
+    return metric
+
+def answer_from_metrics(user_prompt, files_dict, corpus_version):
+    """
+    Answers plain count questions ("How many PRs merged in October 2025?") from the
+    metrics table without calling the LLM. Returns a markdown answer listing the
+    source documents and work items, or None when the question is not recognized
+    or the corpus has no documents for the requested period.
+    """
+    text = user_prompt.lower().strip()
+    metric = _recognize_metric(text)
+    if metric is None:
+        return None
+
+    names = list(files_dict)
+    index = get_temporal_index(names, corpus_version)
+    date_range = question_date_range(text, names, corpus_version)
+    if date_range is not None:
+        in_range = documents_in_range(text, names, corpus_version)
+        if not in_range:
+            return None
+        period = _format_range(*date_range)
+    else:
+        in_range = list(index) + [name for name in names if name not in index]
+        period = "across all documents"
+
+    table = get_metrics_table(files_dict, corpus_version)
+    per_document = {name: table[name]["counts"][metric] for name in in_range}
+    total = sum(per_document.values())
+    label = METRICS[metric][0] if total == 1 else METRICS[metric][1]
+
+    lines = [f"**{total} {label}** {period}.", ""]
+    if len(per_document) > 1:
+        lines.append("**By month:**")
+        lines.extend(f"- {name.replace('_', ' ')}: {count}" for name, count in per_document.items())
+        lines.append("")
+
+    evidence = []
+    for name in in_range:
+        for item in table[name]["items"]:
+            if metric == "prs":
+                evidence.extend(f"- PR {number}: {item['title']} ({name.replace('_', ' ')})"
+                                for number in item["prs"])
+            elif _item_metric(item["type"]) == metric:
+                evidence.append(f"- {item['title']} ({item['date'] or name.replace('_', ' ')})")
+    if evidence:
+        lines.append("**Evidence:**")
+        lines.extend(evidence)
+        lines.append("")
+
+    lines.append(f"_Source documents: {', '.join(name.replace('_', ' ') for name in in_range)}_")
+    logger.info(f"Answered '{metric}' count question from the metrics table")
+    return "\n".join(lines)
+
+def _format_range(start, end):
+    def month_name(year_month):
+        return date(year_month[0], year_month[1], 1).strftime("%B %Y")
+
+    if start == end:
+        return f"in {month_name(start)}"
+    if start[1] == 1 and end[1] == 12 and start[0] == end[0]:
+        return f"in {start[0]}"
+    return f"from {month_name(start)} to {month_name(end)}"
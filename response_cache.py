@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of responses kept in memory (least recently used are evicted)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Seconds a cached response stays valid
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))
+# SQLite file backing the in-memory cache across restarts; empty disables the disk tier
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH", str(Path(__file__).parent / ".cache" / "responses.sqlite3")
+)
+
+_memory = OrderedDict()  # key -> (response, tokens, corpus_version, created_at)
+_lock = threading.Lock()
+_connection = None
+_current_version = None
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "saved_tokens": 0}
+
+def normalize_prompt(user_prompt):
+    """
+    Normalizes a question for cache lookups: case, whitespace and trailing
+    punctuation do not change the answer.
+    """
+    return " ".join(user_prompt.lower().split()).rstrip("?.! ")
+
+def make_cache_key(user_prompt, corpus_version, system_prompt, model, variant=""):
+    """
+    Builds the cache key for a question from the normalized prompt, the corpus
+    version, a hash of the system prompt and the model. variant carries any other
+    setting that changes the prompt sent to the LLM (e.g. the context mode).
+    """
+    system_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    material = "\x1f".join([normalize_prompt(user_prompt), corpus_version or "", system_hash, model, variant])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def _get_connection():
+    """
+    Opens (once) the disk tier. Must be called with _lock held.
+    """
+    global _connection
+
+    if _connection is None:
+        Path(RESPONSE_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(RESPONSE_CACHE_PATH, check_same_thread=False)
+        _connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                corpus_version TEXT NOT NULL,
+                response TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+    return _connection
+
+def _disk_get(key, now):
+    if not RESPONSE_CACHE_PATH:
+        return None
+    try:
+        row = _get_connection().execute(
+            "SELECT response, tokens, corpus_version, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading response cache: {e}")
+        return None
+    if row is None or now - row[3] > RESPONSE_CACHE_TTL:
+        return None
+    return row
+
+def _switch_version(corpus_version):
+    """
+    Drops every entry cached for another corpus version. Must be called with _lock held.
+    """
+    global _current_version
+
+    if corpus_version == _current_version:
+        return
+    _current_version = corpus_version
+    for key in [key for key, entry in _memory.items() if entry[2] != corpus_version]:
+        del _memory[key]
+    if RESPONSE_CACHE_PATH:
+        try:
+            with _get_connection() as connection:
+                connection.execute("DELETE FROM responses WHERE corpus_version != ?", (corpus_version,))
+        except sqlite3.Error as e:
+            logger.error(f"Error pruning response cache: {e}")
+
+def get_cached_response(key, count_miss=True):
+    """
+    Returns the cached response for a key, or None on a miss. Memory is checked
+    first, then the disk tier; disk hits are promoted to memory. Pass
+    count_miss=False when re-checking a key whose miss was already counted.
+    """
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None and now - entry[3] > RESPONSE_CACHE_TTL:
+            del _memory[key]
+            entry = None
+
+        if entry is None:
+            entry = _disk_get(key, now)
+            if entry is not None:
+                _stats["disk_hits"] += 1
+                _memory[key] = entry
+                while len(_memory) > RESPONSE_CACHE_SIZE:
+                    _memory.popitem(last=False)
+
+        if entry is None:
+            if count_miss:
+                _stats["misses"] += 1
+            return None
+
+        _memory.move_to_end(key)
+        _stats["hits"] += 1
+        _stats["saved_tokens"] += entry[1]
+        return entry[0]
+
+def cache_response(key, response, tokens, corpus_version, current_version=None):
+    """
+    Stores a response. tokens is the number of tokens the LLM call consumed, used
+    to report how many tokens cache hits saved. current_version is the version of
+    the published corpus (corpus_version by default): switching to it evicts
+    everything cached for other versions. A response for another version comes
+    from a request that started before a reload; it is not stored, since no new
+    request can ask for it, and it leaves the current version's entries alone.
+    """
+    current_version = current_version or corpus_version
+    if corpus_version != current_version:
+        logger.info(f"Not caching a response for superseded corpus version {corpus_version}")
+        return
+    now = time.time()
+    with _lock:
+        _switch_version(corpus_version)
+        _memory[key] = (response, tokens, corpus_version, now)
+        _memory.move_to_end(key)
+        while len(_memory) > RESPONSE_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+        if RESPONSE_CACHE_PATH:
+            try:
+                with _get_connection() as connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                        (key, corpus_version, response, tokens, now),
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Error writing response cache: {e}")
+
+def get_cache_stats():
+    """
+    Returns hit/miss counters, the hit rate, the estimated tokens saved by cache
+    hits and the number of responses held in memory.
+    """
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            hit_rate=_stats["hits"] / lookups if lookups else 0.0,
+            entries=len(_memory),
+        )
+
+def clear_response_cache():
+    """
+    Empties both cache tiers.
+    """
+    with _lock:
+        _memory.clear()
+        if RESPONSE_CACHE_PATH:
+            try:
+                with _get_connection() as connection:
+                    connection.execute("DELETE FROM responses")
+            except sqlite3.Error as e:
+                logger.error(f"Error clearing response cache: {e}")
+    logger.info("Response cache cleared")
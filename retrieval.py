@@ -0,0 +1,159 @@
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+from token_counter import count_tokens
+from versioned_cache import VersionedCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of chunks sent to the LLM for one question
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "12"))
+# Number of prompt tokens the retrieved chunks may use
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "6000"))
+
+# A chunk is closed once it grows past this many characters
+CHUNK_MAX_CHARS = 1200
+
+# Okapi BM25 parameters
+_K1 = 1.5
+_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# A "Key: value" line such as "Type: Bug Fix" or "Date: 5 September 2025"
+_FIELD_RE = re.compile(r"^[A-Za-z][\w /&-]{0,30}:")
+
+_STOPWORDS = frozenset("""
+    a an and are as at be by did do does for from has have how i in is it its me my
+    of on or our show that the their this to was were what when which who with you your
+""".split())
+
+# BM25 indexes of the current corpus version and the one being swapped in
+_indexes = VersionedCache()
+
+def tokenize(text):
+    """
+    Lower-cases text and splits it into alphanumeric terms, dropping stopwords.
+    """
+    return [term for term in _TOKEN_RE.findall(text.lower()) if term not in _STOPWORDS]
+
+def _is_section_start(lines, i):
+    """
+    A line starts a new section when it is an emoji/symbol-led heading, or a title
+    directly followed by at least two "Key: value" field lines (e.g. Type, Date).
+    """
+    line = lines[i]
+    if ord(line[0]) >= 0x2000 and not line[0].isalnum():
+        return True
+    return (not _FIELD_RE.match(line) and
+            i + 2 < len(lines) and
+            _FIELD_RE.match(lines[i + 1]) is not None and
+            _FIELD_RE.match(lines[i + 2]) is not None)
+
+def chunk_document(name, text):
+    """
+    Splits a document into chunks of consecutive paragraphs, starting a new chunk
+    at each section heading and whenever a chunk grows past CHUNK_MAX_CHARS.
+    Returns a list of {"doc", "index", "text"} dictionaries in document order.
+    """
+    lines = [line for line in text.split("\n") if line.strip()]
+    chunks = []
+    current = []
+    size = 0
+
+    for i, line in enumerate(lines):
+        if current and (_is_section_start(lines, i) or size + len(line) > CHUNK_MAX_CHARS):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+
+    return [{"doc": name, "index": i, "text": chunk} for i, chunk in enumerate(chunks)]
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the chunks of a corpus.
+    """
+
+    def __init__(self, files_dict):
+        self.chunks = []
+        for name, text in files_dict.items():
+            self.chunks.extend(chunk_document(name, text))
+
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for chunk_id, chunk in enumerate(self.chunks):
+            terms = tokenize(f"{chunk['doc'].replace('_', ' ')} {chunk['text']}")
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((chunk_id, tf))
+
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(self.chunks)
+        self.idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query, documents=None):
+        """
+        Scores every chunk against the query. Returns (chunk_id, score) pairs with a
+        positive score, best first. documents optionally restricts the search to a
+        set of document names.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for chunk_id, tf in self.postings[term]:
+                if documents is not None and self.chunks[chunk_id]["doc"] not in documents:
+                    continue
+                norm = _K1 * (1 - _B + _B * self.lengths[chunk_id] / self.avg_length)
+                scores[chunk_id] += idf * tf * (_K1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+def get_index(files_dict, corpus_version):
+    """
+    Returns the BM25 index for the given corpus, built once per corpus version.
+    """
+    def build():
+        index = BM25Index(files_dict)
+        logger.info(f"Built BM25 index: {len(index.chunks)} chunks, {len(index.postings)} terms")
+        return index
+
+    return _indexes.get(corpus_version, build)
+
+def retrieve_chunks(query, files_dict, corpus_version, top_k=None, token_budget=None, documents=None):
+    """
+    Returns the most relevant chunks for the query, at most top_k of them and
+    within token_budget tokens, ordered by document and position so
+    they read naturally. Returns an empty list when nothing matches the query.
+    """
+    top_k = RETRIEVAL_TOP_K if top_k is None else top_k
+    token_budget = RETRIEVAL_TOKEN_BUDGET if token_budget is None else token_budget
+
+    index = get_index(files_dict, corpus_version)
+    selected = []
+    used_tokens = 0
+    for chunk_id, _ in index.search(query, documents):
+        if len(selected) >= top_k:
+            break
+        tokens = count_tokens(index.chunks[chunk_id]["text"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(chunk_id)
+        used_tokens += tokens
+
+    doc_order = {name: i for i, name in enumerate(files_dict)}
+    chunks = [index.chunks[chunk_id] for chunk_id in selected]
+    chunks.sort(key=lambda chunk: (doc_order.get(chunk["doc"], len(doc_order)), chunk["index"]))
+    logger.info(f"Retrieved {len(chunks)} chunks ({used_tokens} tokens) for the query")
+    return chunks
@@ -1,36 +1,174 @@
 #!/usr/bin/env python3
 """
 Simple runner script for work_impact_agent
+
+Interactive (one prompt):   python run_agent.py
+Batch (one prompt per line, or JSON lines with "prompt" and optional "id"):
+    python run_agent.py --batch prompts.txt --output results.jsonl --concurrency 8
+    cat prompts.txt | python run_agent.py --batch -
 """
 
-from work_impact_agent import work_impact_agent
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from llm_client import LLMError
+from work_impact_agent import (
+    get_last_request_info,
+    read_docx_files_from_work_doc,
+    work_impact_agent_async,
+    work_impact_agent_stream,
+)
+
+# Default number of batch prompts answered at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
 
 def main():
     print("Work Impact Agent Runner")
     print("="*50)
-    
+
     # Get user input
     user_prompt = input("\nEnter your prompt (or press Enter for default): ").strip()
-    
+
     if not user_prompt:
         user_prompt = "Please provide a leadership summary of my work."
-    
+
     print(f"\nProcessing with prompt: {user_prompt}")
     print("="*50)
-    
+
     try:
-        response = work_impact_agent(user_prompt=user_prompt)
-        
-        if response:
-            print("\n" + "="*80)
-            print("GENERATED SUMMARY:")
-            print("="*80)
-            print(response)
+        received = False
+
+        # Print the answer progressively as it streams in
+        for delta in work_impact_agent_stream(user_prompt=user_prompt):
+            if not received:
+                print("\n" + "="*80)
+                print("GENERATED SUMMARY:")
+                print("="*80)
+                received = True
+            print(delta, end="", flush=True)
+
+        if received:
+            print()
         else:
             print("No response received from LLM")
-            
+
+    except LLMError as e:
+        print(f"\nError: {e.user_message} ({e})")
     except Exception as e:
         print(f"Error: {e}")
 
+def read_batch_prompts(lines):
+    """
+    Parses batch input: one prompt per line, or a JSON object per line with a
+    "prompt" and an optional "id". Blank lines and lines starting with # are
+    skipped. Returns a list of {"id", "prompt"}; a line that cannot be parsed
+    becomes {"id", "prompt": None, "error"} so it is reported with the results
+    instead of stopping the batch.
+    """
+    items = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                items.append({"id": line_number, "prompt": None, "error": f"Line {line_number}: invalid JSON ({e.msg})"})
+                continue
+            prompt = record.get("prompt") if isinstance(record, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                items.append({"id": line_number, "prompt": None,
+                              "error": f'Line {line_number}: JSON object without a "prompt" string'})
+                continue
+            items.append({"id": record.get("id", line_number), "prompt": prompt})
+        else:
+            items.append({"id": line_number, "prompt": line})
+    return items
+
+async def run_batch(items, output, concurrency=None, context_mode=None):
+    """
+    Answers every batch item through work_impact_agent_async, at most
+    concurrency at a time, sharing one corpus and response cache. Writes one
+    JSON line per item to output as soon as it completes, with its latency,
+    how it was answered, its token usage and any error. Returns the number of
+    failed items.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or BATCH_CONCURRENCY))
+    failed = 0
+
+    # Parse the corpus once before the prompts start competing for it
+    await asyncio.to_thread(read_docx_files_from_work_doc)
+
+    async def run_one(item):
+        nonlocal failed
+        async with semaphore:
+            started = time.perf_counter()
+            answer, error, info = None, item.get("error"), {}
+            if error is None:
+                try:
+                    answer = await work_impact_agent_async(user_prompt=item["prompt"], context_mode=context_mode)
+                    if not answer:
+                        answer, error = None, "No answer produced (check the work_doc directory and the logs)"
+                except LLMError as e:
+                    error = f"{e.__class__.__name__}: {e.user_message}"
+                except Exception as e:
+                    error = f"{e.__class__.__name__}: {e}"
+                info = get_last_request_info() or {}
+
+            record = {
+                "id": item["id"],
+                "prompt": item["prompt"],
+                "answer": answer,
+                "error": error,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "source": info.get("source"),
+                "prompt_tokens": info.get("prompt_tokens"),
+                "usage": info.get("usage"),
+                "shard_tokens": info.get("shard_tokens", 0),
+            }
+            if error:
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+    await asyncio.gather(*(run_one(item) for item in items))
+    return failed
+
+def batch_main(args):
+    if args.batch == "-":
+        items = read_batch_prompts(sys.stdin)
+    else:
+        with open(args.batch, encoding="utf-8") as f:
+            items = read_batch_prompts(f)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        failed = asyncio.run(run_batch(items, output, args.concurrency, args.context_mode))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Answered {len(items) - failed}/{len(items)} prompts in {elapsed:.1f}s "
+          f"({len(items) / elapsed if elapsed else 0:.2f} prompts/s)", file=sys.stderr)
+    return 1 if failed else 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ask work_impact_agent one prompt interactively, or many in batch.")
+    parser.add_argument("--batch", metavar="FILE", help="file of prompts to answer, or - for stdin")
+    parser.add_argument("--output", metavar="FILE", help="JSONL results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help=f"prompts answered at the same time (default: {BATCH_CONCURRENCY})")
+    parser.add_argument("--context-mode", default=None,
+                        help="override CONTEXT_MODE (auto, retrieval, summaries, fanout, full)")
+    args = parser.parse_args()
+
+    if args.batch:
+        sys.exit(batch_main(args))
+    main()
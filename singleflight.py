@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import threading
+
+from llm_client import LLMError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_flights = {}
+_lock = threading.Lock()
+_stats = {"leaders": 0, "followers": 0}
+
+class FlightCancelled(LLMError):
+    """
+    The leader of a flight went away (e.g. its client disconnected) before the
+    answer was complete. Followers that received nothing yet join again and
+    answer the question themselves.
+    """
+    user_message = "The request answering this question was cancelled. Please try again."
+
+class Flight:
+    """
+    One in-flight LLM answer shared by identical concurrent requests. The leader
+    publishes the answer as it streams in; followers, sync or async, in any
+    thread, read the same text pieces as they arrive.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.followers = 0
+        self.deltas = []
+        self.done = False
+        self.error = None
+        self._condition = threading.Condition()
+        self._async_waiters = []  # (event loop, asyncio.Event) of waiting async followers
+
+    def _notify(self):
+        # Must be called with _condition held
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # the follower's event loop is gone
+
+    def publish(self, delta):
+        """
+        Hands the next piece of the answer to the followers.
+        """
+        with self._condition:
+            self.deltas.append(delta)
+            self._notify()
+
+    def finish(self, error=None):
+        """
+        Ends the flight, successfully or with the error the leader hit, and
+        unregisters it so later identical requests start a new one (or hit the
+        response cache).
+        """
+        if error is not None and not isinstance(error, Exception):
+            # The leader was cancelled (e.g. its client disconnected)
+            error = FlightCancelled("The request answering this question was cancelled")
+        with _lock:
+            if _flights.get(self.key) is self:
+                del _flights[self.key]
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._notify()
+
+    def _snapshot(self, index):
+        with self._condition:
+            return self.deltas[index:], self.done, self.error
+
+    def iter_deltas(self):
+        """
+        Yields the answer's text pieces as the leader publishes them, blocking in
+        between. Raises the leader's error if it failed.
+        """
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self.deltas) > index or self.done)
+            new, done, error = self._snapshot(index)
+            yield from new
+            index += len(new)
+            if done and not new:
+                if error is not None:
+                    raise error
+                return
+
+    async def aiter_deltas(self):
+        """
+        Async variant of iter_deltas; waiting does not block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            event = asyncio.Event()
+            with self._condition:
+                ready = len(self.deltas) > index or self.done
+                if not ready:
+                    self._async_waiters.append((loop, event))
+            if not ready:
+                await event.wait()
+            new, done, error = self._snapshot(index)
+            for delta in new:
+                yield delta
+            index += len(new)
+            if done and not new:
+                if error is not None:
+                    raise error
+                return
+
+    def result(self):
+        """
+        Waits for the leader and returns the whole answer.
+        """
+        return "".join(self.iter_deltas())
+
+    async def aresult(self):
+        """
+        Async variant of result.
+        """
+        return "".join([delta async for delta in self.aiter_deltas()])
+
+def join_flight(key):
+    """
+    Returns (flight, is_leader) for a request key. The first request for a key
+    leads: it must call the LLM, publish() the answer and finish() the flight.
+    Identical requests arriving before it finishes follow the same flight.
+    """
+    with _lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            _stats["followers"] += 1
+            logger.info("Identical request already in flight, sharing its answer")
+            return flight, False
+        flight = _flights[key] = Flight(key)
+        _stats["leaders"] += 1
+        return flight, True
+
+def get_flight_stats():
+    """
+    Returns how many requests led a flight (called the LLM), how many followed
+    one (shared an in-flight answer) and how many flights are in progress.
+    """
+    with _lock:
+        return dict(_stats, in_flight=len(_flights))
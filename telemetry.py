@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds, shared by all latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_metrics = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if isinstance(value, float):
+        return "+Inf" if value == float("inf") else repr(value)
+    return str(value)
+
+class _Metric:
+    """
+    A metric with a fixed set of label names, rendered in the Prometheus text
+    exposition format. Values are kept per combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(list(zip(self.labels, key)), value))
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, pairs, value):
+        return [f"{self.name}{_format_labels(pairs)} {_format_value(value)}"]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self, pairs, value):
+        counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(float(bound)))])} {bucket_count}"
+            for bound, bucket_count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+STAGE_SECONDS = Histogram(
+    "work_impact_stage_seconds",
+    "Time spent in each stage of answering a question "
+    "(corpus_load, prompt_assembly, fanout, llm_ttft, llm_total, ui_format).",
+    labels=("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "work_impact_request_seconds",
+    "End-to-end time to answer a question, by how it was answered.",
+    labels=("source",),
+)
+REQUESTS = Counter(
+    "work_impact_requests_total",
+    "Questions answered, by source (metrics, cache, shared, llm).",
+    labels=("source",),
+)
+LLM_TOKENS = Counter(
+    "work_impact_llm_tokens_total",
+    "LLM tokens used to answer questions, by kind (prompt, completion, shard).",
+    labels=("kind",),
+)
+ERRORS = Counter(
+    "work_impact_errors_total",
+    "Questions that failed, by error type.",
+    labels=("error",),
+)
+CORPUS_DOCUMENTS = Gauge(
+    "work_impact_corpus_documents",
+    "Documents in the loaded corpus.",
+)
+
+def observe_stage(stage, seconds):
+    """
+    Records the duration of one stage of a request.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+@contextmanager
+def timed_stage(stage, on_stage=None):
+    """
+    Times the enclosed block as a request stage. on_stage, when given, is called
+    with the stage name as the stage begins (e.g. to show it in the UI).
+    """
+    if on_stage is not None:
+        try:
+            on_stage(stage)
+        except Exception as e:
+            logger.debug(f"Stage callback failed for {stage}: {e}")
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def record_request(source, seconds, usage=None, shard_tokens=0):
+    """
+    Counts an answered question and its end-to-end latency and token usage.
+    """
+    REQUESTS.inc(source=source)
+    REQUEST_SECONDS.observe(seconds, source=source)
+    if usage:
+        LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+    if shard_tokens:
+        LLM_TOKENS.inc(shard_tokens, kind="shard")
+
+def record_error(error):
+    """
+    Counts a failed question by its exception class.
+    """
+    ERRORS.inc(error=error.__class__.__name__)
+
+def _process_lines():
+    # Counters kept by other modules, read at scrape time
+    from response_cache import get_cache_stats
+    from singleflight import get_flight_stats
+
+    cache = get_cache_stats()
+    flights = get_flight_stats()
+    return [
+        "# HELP work_impact_response_cache_lookups_total Response cache lookups, by result.",
+        "# TYPE work_impact_response_cache_lookups_total counter",
+        f'work_impact_response_cache_lookups_total{{result="hit"}} {cache["hits"]}',
+        f'work_impact_response_cache_lookups_total{{result="miss"}} {cache["misses"]}',
+        "# HELP work_impact_response_cache_disk_hits_total Response cache hits served from the disk tier.",
+        "# TYPE work_impact_response_cache_disk_hits_total counter",
+        f"work_impact_response_cache_disk_hits_total {cache['disk_hits']}",
+        "# HELP work_impact_response_cache_saved_tokens_total Tokens not spent thanks to response cache hits.",
+        "# TYPE work_impact_response_cache_saved_tokens_total counter",
+        f"work_impact_response_cache_saved_tokens_total {cache['saved_tokens']}",
+        "# HELP work_impact_response_cache_entries Responses held in the in-memory cache.",
+        "# TYPE work_impact_response_cache_entries gauge",
+        f"work_impact_response_cache_entries {cache['entries']}",
+        "# HELP work_impact_flights_total Requests that led an LLM call or shared an identical in-flight one.",
+        "# TYPE work_impact_flights_total counter",
+        f'work_impact_flights_total{{role="leader"}} {flights["leaders"]}',
+        f'work_impact_flights_total{{role="follower"}} {flights["followers"]}',
+        "# HELP work_impact_flights_in_progress LLM answers currently being generated.",
+        "# TYPE work_impact_flights_in_progress gauge",
+        f"work_impact_flights_in_progress {flights['in_flight']}",
+    ]
+
+def render_metrics():
+    """
+    Returns every metric in the Prometheus text exposition format (version 0.0.4).
+    """
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(_process_lines())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,267 @@
+import logging
+import re
+from datetime import date
+
+from versioned_cache import VersionedCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_ORDINALS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+
+_MONTH_NAMES = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_YEAR = r"(?:19|20)\d{2}"
+
+# Document names such as "March_2025", "Mar-2025", "2025_03" or "2025-03-monthly"
+_NAME_MONTH_YEAR_RE = re.compile(rf"\b({_MONTH_NAMES})[\s_\-]*({_YEAR})\b")
+_NAME_YEAR_MONTH_RE = re.compile(rf"\b({_YEAR})[\s_\-](0?[1-9]|1[0-2])\b")
+
+_LAST_N_MONTHS_RE = re.compile(
+    rf"\b(?:last|past|previous|recent)\s+(\d{{1,2}}|{'|'.join(_NUMBER_WORDS)})\s+months?\b"
+)
+_QUARTER_RE = re.compile(rf"\bq([1-4])\b(?:\s*(?:of\s+)?({_YEAR}))?")
+_ORDINAL_QUARTER_RE = re.compile(
+    rf"\b({'|'.join(_ORDINALS)})\s+quarter\b(?:\s+(?:of\s+)?({_YEAR}))?"
+)
+_LAST_QUARTER_OF_YEAR_RE = re.compile(rf"\b(?:last|final)\s+quarter\s+(?:of\s+)?({_YEAR})\b")
+_HALF_RE = re.compile(rf"\b(?:h([12])|(first|second)\s+half)\b(?:\s+(?:of\s+)?({_YEAR}))?")
+_MONTH_MENTION_RE = re.compile(rf"\b({_MONTH_NAMES})\b\.?(?:\s*,?\s*({_YEAR}))?")
+_YEAR_RE = re.compile(rf"\b({_YEAR})\b")
+# Prepositions that leave a range open: "since July 2025" runs to the latest
+# month, "until March" from the earliest one
+_RANGE_START_WORDS = ("since", "after", "from")
+_RANGE_END_WORDS = ("until", "till", "before", "through", "to")
+_PREPOSITION_RE = re.compile(rf"\b({'|'.join(_RANGE_START_WORDS + _RANGE_END_WORDS)})\s+(?:the\s+)?(?:end\s+of\s+)?$")
+# Oldest month an open-ended range can reach when the corpus start is unknown
+_EARLIEST = (1900, 1)
+
+# Temporal indexes of the current corpus version and the one being swapped in
+_indexes = VersionedCache()
+
+def _month_number(year, month):
+    return year * 12 + (month - 1)
+
+def _from_month_number(number):
+    year, month = divmod(number, 12)
+    return year, month + 1
+
+def parse_document_month(name):
+    """
+    Returns the (year, month) a document covers based on its name, or None if
+    the name carries no recognizable month.
+    """
+    lowered = name.lower()
+    match = _NAME_MONTH_YEAR_RE.search(lowered)
+    if match:
+        return int(match.group(2)), _MONTHS[match.group(1)]
+    match = _NAME_YEAR_MONTH_RE.search(lowered)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return None
+
+def get_temporal_index(names, corpus_version):
+    """
+    Returns the temporal index of the corpus: a dictionary of document name ->
+    (year, month) for every dated document, in chronological order. Built once
+    per corpus version.
+    """
+    def build():
+        dated = {name: parse_document_month(name) for name in names}
+        index = dict(sorted(
+            ((name, month) for name, month in dated.items() if month is not None),
+            key=lambda item: (item[1], item[0]),
+        ))
+        logger.info(f"Built temporal index: {len(index)} of {len(dated)} documents dated")
+        return index
+
+    return _indexes.get(corpus_version, build)
+
+def _open_range(mentions, anchor, earliest):
+    """
+    Builds the range for month or year mentions, given as (preposition or None,
+    first month number, last month number) in question order. "since"/"from X"
+    start at X and "after X" just past it, running to anchor unless an end is
+    given; "until"/"through X" end with X and "before X" just before it,
+    starting at earliest unless a start is given. A plain mention before
+    "to"/"through"/"until X" is the start of a closed range ("July to
+    September"). Returns None when the mentions don't make one range (e.g. two
+    starts).
+    """
+    starts = [first + (last - first + 1 if word == "after" else 0)
+              for word, first, last in mentions if word in _RANGE_START_WORDS]
+    ends = [(first - 1 if word == "before" else last)
+            for word, first, last in mentions if word in _RANGE_END_WORDS]
+    plain = [(first, last) for word, first, last in mentions if word is None]
+    if not starts and not ends:
+        return min(first for first, _ in plain), max(last for _, last in plain)
+    if len(starts) > 1 or len(ends) > 1:
+        return None
+    if not starts:
+        end_index = next(index for index, (word, _, _) in enumerate(mentions) if word in _RANGE_END_WORDS)
+        if mentions[end_index][0] != "before":
+            starts = [first for word, first, _ in mentions[:end_index] if word is None][:1]
+    start = starts[0] if starts else _month_number(*earliest)
+    end = ends[0] if ends else max(_month_number(*anchor), start)
+    # Other months must fall inside the range ("since June, especially July")
+    if start > end or any(first < start or last > end for first, last in plain):
+        return None
+    return start, end
+
+def _resolve_years(months, default_year):
+    """
+    Gives each (preposition, month, year or None) mention a year. Without any
+    explicit year all months share default_year. Otherwise a yearless month
+    takes the year of the mention before it, or the next year when it is an
+    earlier month ("November 2024 to January"); yearless months before the
+    first explicit year take that year, or the one before ("November and
+    January 2025").
+    """
+    years = [year for _, _, year in months]
+    if not any(years):
+        return [default_year] * len(months)
+    first_dated = next(index for index, year in enumerate(years) if year)
+    for index in range(first_dated - 1, -1, -1):
+        later_month, later_year = months[index + 1][1], years[index + 1]
+        years[index] = later_year - (1 if months[index][1] > later_month else 0)
+    for index in range(first_dated + 1, len(months)):
+        if not years[index]:
+            earlier_month, earlier_year = months[index - 1][1], years[index - 1]
+            years[index] = earlier_year + (1 if months[index][1] < earlier_month else 0)
+    return years
+
+def _preposition(text, position):
+    match = _PREPOSITION_RE.search(text, 0, position)
+    return match.group(1) if match else None
+
+def resolve_date_range(query, anchor, earliest=None):
+    """
+    Resolves the time range a question refers to, as a pair of inclusive
+    (year, month) bounds, or None if the question is not time-scoped.
+    Relative phrases ("last three months", "this quarter", "this year") are
+    resolved against anchor, a (year, month) tuple; open-ended ones ("since
+    July 2025", "before March") run to anchor or from earliest.
+    """
+    earliest = earliest or _EARLIEST
+    text = query.lower()
+    anchor_year, anchor_month = anchor
+    anchor_number = _month_number(anchor_year, anchor_month)
+    anchor_quarter = (anchor_month - 1) // 3 + 1
+
+    match = _LAST_N_MONTHS_RE.search(text)
+    if match:
+        count = match.group(1)
+        count = int(count) if count.isdigit() else _NUMBER_WORDS[count]
+        return _from_month_number(anchor_number - max(count, 1) + 1), anchor
+
+    if re.search(r"\b(?:this|current)\s+month\b", text):
+        return anchor, anchor
+    if re.search(r"\b(?:last|previous)\s+month\b(?!\s+of\b)", text):
+        previous = _from_month_number(anchor_number - 1)
+        return previous, previous
+
+    # Explicit quarters first: "the last quarter of 2025" is Q4 2025, not the
+    # quarter before the anchor
+    quarter, year = None, None
+    match = _LAST_QUARTER_OF_YEAR_RE.search(text)
+    if match:
+        quarter, year = 4, int(match.group(1))
+    else:
+        match = _QUARTER_RE.search(text) or _ORDINAL_QUARTER_RE.search(text)
+        if match:
+            quarter = int(match.group(1)) if match.group(1).isdigit() else _ORDINALS[match.group(1)]
+            year = int(match.group(2)) if match.group(2) else anchor_year
+        elif re.search(r"\b(?:this|current)\s+quarter\b", text):
+            quarter, year = anchor_quarter, anchor_year
+        elif re.search(r"\b(?:last|previous)\s+quarter\b", text):
+            quarter, year = (anchor_quarter - 1, anchor_year) if anchor_quarter > 1 else (4, anchor_year - 1)
+    if quarter is not None:
+        return (year, quarter * 3 - 2), (year, quarter * 3)
+
+    match = _HALF_RE.search(text)
+    if match:
+        half = int(match.group(1)) if match.group(1) else (1 if match.group(2) == "first" else 2)
+        year = int(match.group(3)) if match.group(3) else anchor_year
+        return (year, half * 6 - 5), (year, half * 6)
+
+    if re.search(r"\b(?:this|current)\s+year\b", text):
+        return (anchor_year, 1), (anchor_year, 12)
+    if re.search(r"\b(?:last|previous)\s+year\b", text):
+        return (anchor_year - 1, 1), (anchor_year - 1, 12)
+
+    # Month names, e.g. "October 2025", "between June and August 2025", "since July 2025"
+    years = [int(year) for year in _YEAR_RE.findall(text)]
+    months = []
+    for match in _MONTH_MENTION_RE.finditer(text):
+        name, year = match.group(1), match.group(2)
+        # "may" and "mar" are only months when a year or a date preposition says so
+        if name in ("may", "mar") and not year and not re.search(
+            rf"\b(?:in|of|during|for|from|since|until|till|before|after|through|to|and)\s+{name}\b", text
+        ):
+            continue
+        months.append((_preposition(text, match.start()), _MONTHS[name], int(year) if year else None))
+    if months:
+        mentions = []
+        for (word, month, _), year in zip(months, _resolve_years(months, years[-1] if years else anchor_year)):
+            number = _month_number(year, month)
+            mentions.append((word, number, number))
+        numbers = _open_range(mentions, anchor, earliest)
+        return (_from_month_number(numbers[0]), _from_month_number(numbers[1])) if numbers else None
+
+    # Years alone, e.g. "in 2024", "since 2024"
+    mentions = [(_preposition(text, match.start()), _month_number(int(match.group(1)), 1),
+                 _month_number(int(match.group(1)), 12)) for match in _YEAR_RE.finditer(text)]
+    if mentions:
+        numbers = _open_range(mentions, anchor, earliest)
+        return (_from_month_number(numbers[0]), _from_month_number(numbers[1])) if numbers else None
+
+    return None
+
+def question_date_range(query, names, corpus_version):
+    """
+    Resolves the time range a question refers to against the corpus. Relative
+    ranges are anchored at the latest dated document, since the corpus is a log
+    that may end well before today; open-ended ranges reach back to the earliest.
+    """
+    index = get_temporal_index(names, corpus_version)
+    if index:
+        anchor, earliest = max(index.values()), min(index.values())
+    else:
+        today = date.today()
+        anchor, earliest = (today.year, today.month), None
+    return resolve_date_range(query, anchor, earliest)
+
+def documents_in_range(query, names, corpus_version):
+    """
+    Returns the names of the documents covering the time range the question
+    refers to, in chronological order, or None when the question is not
+    time-scoped or no document falls in the range (callers then use the whole
+    corpus).
+    """
+    date_range = question_date_range(query, names, corpus_version)
+    if date_range is None:
+        return None
+
+    index = get_temporal_index(names, corpus_version)
+    start, end = date_range
+    in_range = [name for name, month in index.items() if start <= month <= end]
+    logger.info(f"Question refers to {start[1]}/{start[0]} - {end[1]}/{end[0]}: "
+                f"{len(in_range)} documents in range")
+    return in_range or None
+
+def sort_chronologically(names):
+    """
+    Orders document names by the month they cover; undated documents go last,
+    in their original order.
+    """
+    months = {name: parse_document_month(name) for name in names}
+    return sorted(names, key=lambda name: (months[name] is None, months[name] or (0, 0)))
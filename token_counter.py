@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+
+from versioned_cache import VersionedCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum prompt tokens (system prompt + question + documents) sent with one request.
+# gpt-4o has a 128k context window; the default leaves room for the answer.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "100000"))
+# tiktoken encoding used to count tokens
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+# Tokens the chat format adds around each message
+_MESSAGE_OVERHEAD = 4
+_TRUNCATION_MARKER = "\n[... truncated to fit the token budget]"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Document token counts of the current corpus version and the one being swapped in
+_document_counts = VersionedCache()
+
+def _get_encoding():
+    """
+    Returns the tiktoken encoding, or None when tiktoken is not installed (token
+    counts then fall back to an estimate).
+    """
+    global _encoding, _encoding_loaded
+
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                logger.info(f"tiktoken unavailable ({e}), estimating token counts")
+        return _encoding
+
+def count_tokens(text):
+    """
+    Returns the number of tokens in text: exact with tiktoken, otherwise a rough
+    estimate of about four characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def token_count_label():
+    """
+    Returns "" when token counts are exact and " (estimated)" when they fall
+    back to the character estimate, for log lines that report counts.
+    """
+    return "" if _get_encoding() is not None else " (estimated)"
+
+def count_message_tokens(system_prompt, user_prompt):
+    """
+    Returns the prompt tokens of a system + user chat request.
+    """
+    return count_tokens(system_prompt) + count_tokens(user_prompt) + 2 * _MESSAGE_OVERHEAD + 3
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cuts text down to at most max_tokens tokens, keeping the beginning and
+    marking the cut. Returns text unchanged when it already fits.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens - count_tokens(_TRUNCATION_MARKER), 0)
+    encoding = _get_encoding()
+    if encoding is not None:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    else:
+        head = text[:max(keep - 1, 0) * 4]
+    return head + _TRUNCATION_MARKER
+
+def get_document_token_counts(files_dict, corpus_version):
+    """
+    Returns the token count of every document: document name -> tokens.
+    Computed once per corpus version.
+    """
+    def build():
+        counts = {name: count_tokens(text) for name, text in files_dict.items()}
+        logger.info(f"Counted tokens for {len(counts)} documents: {sum(counts.values())} total{token_count_label()}")
+        return counts
+
+    return _document_counts.get(corpus_version, build)
+
+def fit_sections_to_budget(sections, priority, available_tokens, section_tokens=None, section_overhead=0):
+    """
+    Keeps the (document name, text) sections within available_tokens. Sections
+    are admitted in priority order (a list of names, most important first); the
+    first one that does not fit is trimmed to the remaining tokens and the rest
+    are dropped. section_tokens may carry known counts (name -> tokens) and
+    section_overhead the tokens each section's heading adds.
+    Returns (sections in their original order, dropped names, trimmed names).
+    """
+    texts = dict(sections)
+    section_tokens = section_tokens or {}
+    kept = {}
+    dropped, trimmed = [], []
+    remaining = available_tokens
+
+    for name in priority:
+        text = texts[name]
+        tokens = section_tokens.get(name)
+        if tokens is None:
+            tokens = count_tokens(text)
+        tokens += section_overhead
+        if tokens <= remaining:
+            kept[name] = text
+            remaining -= tokens
+        elif not trimmed and remaining - section_overhead > 2 * count_tokens(_TRUNCATION_MARKER):
+            kept[name] = truncate_to_tokens(text, remaining - section_overhead)
+            remaining -= count_tokens(kept[name]) + section_overhead
+            trimmed.append(name)
+        else:
+            dropped.append(name)
+
+    return [(name, kept[name]) for name, _ in sections if name in kept], dropped, trimmed
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+class VersionedCache:
+    """
+    Holds a value derived from the corpus (an index, a table) for the most
+    recent corpus versions: by default the one requests are using and the one
+    being built for the next corpus swap, so building the next never evicts the
+    current. Values are built outside the lock: readers of a version that is
+    already built never wait for another version's build.
+    """
+
+    def __init__(self, versions=2):
+        self.versions = versions
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}  # version -> lock held while that version is built
+
+    def get(self, version, build):
+        """
+        Returns the value for version, calling build() to create it on first use.
+        Concurrent callers for the same version share one build.
+        """
+        with self._lock:
+            if version in self._values:
+                self._values.move_to_end(version)
+                return self._values[version]
+            build_lock = self._building.setdefault(version, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if version in self._values:
+                    return self._values[version]
+            value = build()
+            with self._lock:
+                self._values[version] = value
+                while len(self._values) > self.versions:
+                    self._values.popitem(last=False)
+                self._building.pop(version, None)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus_watcher import start_watcher
+from llm_client import warm_connection, warm_connection_async
+from work_impact_agent import (
+    build_indexes, get_snapshot, prepare_document_summaries, read_docx_files_from_work_doc,
+    work_impact_agent,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pre-compute answers for the UI's example prompts in the background
+PREWARM_EXAMPLES = os.getenv("PREWARM_EXAMPLES", "1") == "1"
+# Maximum number of example prompts answered at the same time
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+# Seconds between checks for a changed corpus that needs re-warming (the corpus
+# watcher also triggers one after each reload; this is the fallback)
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "300"))
+# Report ready only after the example prompts are answered too (not just the corpus and connection)
+READY_AFTER_PREWARM = os.getenv("READY_AFTER_PREWARM", "0") == "1"
+# Seconds between attempts when loading the corpus fails during warm-up
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+# Set by the corpus watcher after a reload, so the new corpus is pre-warmed right away
+_corpus_reloaded = threading.Event()
+
+# Warm-up steps: name -> {"state": "pending" | "running" | "done" | "failed", "seconds", "error"}
+_steps = {}
+_steps_lock = threading.Lock()
+
+def clean_example_prompt(prompt_text):
+    """
+    Removes the leading emoji from an example prompt button label. The UI and the
+    warm-up job must both use this so their cache keys match.
+    """
+    return prompt_text.split(' ', 1)[1] if ' ' in prompt_text else prompt_text
+
+def prewarm_example_prompts(prompts, concurrency=None):
+    """
+    Answers every example prompt through work_impact_agent, which stores the
+    answers in the response cache. Returns the number of prompts answered.
+    """
+    concurrency = concurrency or PREWARM_CONCURRENCY
+    cleaned = list(dict.fromkeys(clean_example_prompt(prompt) for prompt in prompts))
+    logger.info(f"Pre-warming {len(cleaned)} example prompts (concurrency {concurrency})")
+
+    def warm(prompt):
+        try:
+            return bool(work_impact_agent(user_prompt=prompt))
+        except Exception as e:
+            logger.error(f"Error pre-warming '{prompt}': {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prewarm") as executor:
+        warmed = sum(executor.map(warm, cleaned))
+
+    logger.info(f"Pre-warmed {warmed}/{len(cleaned)} example prompts")
+    return warmed
+
+def _required_steps():
+    steps = ["corpus", "indexes", "llm_connection"]
+    if READY_AFTER_PREWARM and PREWARM_EXAMPLES:
+        steps.append("prewarm")
+    return steps
+
+def _set_step(step, **fields):
+    with _steps_lock:
+        _steps.setdefault(step, {"state": "pending", "seconds": None, "error": None}).update(fields)
+
+def _run_step(step, function):
+    """
+    Runs one warm-up step, recording its state and duration. Re-raises its error.
+    """
+    _set_step(step, state="running")
+    started = time.perf_counter()
+    try:
+        result = function()
+    except Exception as e:
+        _set_step(step, state="failed", seconds=time.perf_counter() - started, error=str(e))
+        raise
+    _set_step(step, state="done", seconds=time.perf_counter() - started, error=None)
+    logger.info(f"Warm-up step {step} done in {time.perf_counter() - started:.2f}s")
+    return result
+
+def _prewarm(prompts):
+    # Summaries first: broad example prompts are answered from them
+    prepare_document_summaries()
+    return prewarm_example_prompts(prompts)
+
+def _warmup_loop(prompts):
+    # Load the corpus and build its indexes, retrying until it works: the
+    # instance is not ready before
+    while True:
+        try:
+            _run_step("corpus", read_docx_files_from_work_doc)
+            _run_step("indexes", build_indexes)
+            break
+        except Exception as e:
+            logger.error(f"Warm-up failed, retrying in {WARMUP_RETRY_INTERVAL:g}s: {e}")
+            time.sleep(WARMUP_RETRY_INTERVAL)
+    # From now on document changes are loaded in the background, off the request path
+    start_watcher(on_reload=_corpus_reloaded.set)
+    # The CLI / batch / pre-warm callers use the sync client
+    warm_connection()
+
+    warmed_version = None
+    while True:
+        # Cleared before checking, so a reload during the pre-warm triggers another pass
+        _corpus_reloaded.clear()
+        try:
+            snapshot = get_snapshot()
+            corpus_version = snapshot.version if snapshot else None
+            if PREWARM_EXAMPLES and corpus_version and corpus_version != warmed_version:
+                if warmed_version is None:
+                    _run_step("prewarm", lambda: _prewarm(prompts))
+                else:
+                    _prewarm(prompts)
+                warmed_version = corpus_version
+        except Exception as e:
+            logger.error(f"Error in pre-warm loop: {e}")
+        _corpus_reloaded.wait(PREWARM_INTERVAL)
+
+def start_warmup(prompts):
+    """
+    Starts the background warm-up pipeline (once per process): it loads the
+    corpus and builds its indexes, starts the corpus watcher, then summarizes
+    new or changed documents and answers the example prompts, at startup and
+    again as soon as the watcher reloads a changed work_doc corpus. get_readiness() reports its
+    progress.
+    """
+    global _warmup_thread
+
+    with _warmup_lock:
+        if _warmup_thread is None:
+            for step in _required_steps():
+                _set_step(step)
+            _warmup_thread = threading.Thread(
+                target=_warmup_loop, args=(list(prompts),), name="warmup", daemon=True
+            )
+            _warmup_thread.start()
+
+async def warm_llm_connection():
+    """
+    Opens the async client's connection to Azure OpenAI. Must run on the web
+    server's event loop. An unreachable service is logged and doesn't block
+    readiness: the instance can still answer from its caches and metrics table.
+    """
+    started = time.perf_counter()
+    _set_step("llm_connection", state="running")
+    connected = await warm_connection_async()
+    _set_step("llm_connection", state="done", seconds=time.perf_counter() - started,
+              error=None if connected else "Azure OpenAI endpoint unreachable")
+
+def get_readiness():
+    """
+    Returns (ready, steps): ready once every required warm-up step is done,
+    with the state, duration and error of each step.
+    """
+    with _steps_lock:
+        steps = {step: dict(fields) for step, fields in _steps.items()}
+    ready = bool(steps) and all(steps.get(step, {}).get("state") == "done" for step in _required_steps())
+    return ready, steps
@@ -1,127 +1,952 @@
+import asyncio
+import contextvars
+import hashlib
 import logging
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from docx import Document
-from constant import SYSTEM_PROMPT
-from llm_client import ask_llm
+from constant import SHARD_SYSTEM_PROMPT, SYSTEM_PROMPT
+from conversation import build_conversation_context, history_key, previous_question
+from corpus_snapshot import CorpusSnapshot
+from corpus_store import load_corpus, load_text, save_corpus
+from docx_text import DOCX_EXTRACTOR, extract_many
+from document_summaries import get_document_summaries, summary_variant
+from fanout import FANOUT_SHARD, run_shards, run_shards_async
+from llm_client import (
+    DEFAULT_MODEL, LLMError, ask_llm_stream, ask_llm_stream_async, get_last_usage,
+)
+from metrics_store import answer_from_metrics
+from response_cache import cache_response, get_cached_response, make_cache_key
+from singleflight import FlightCancelled, join_flight
+from telemetry import CORPUS_DOCUMENTS, observe_stage, record_error, record_request, timed_stage
+from retrieval import RETRIEVAL_TOKEN_BUDGET, retrieve_chunks
+from temporal_index import documents_in_range, parse_document_month, question_date_range, sort_chronologically
+from token_counter import (
+    PROMPT_TOKEN_BUDGET, count_message_tokens, count_tokens, fit_sections_to_budget, token_count_label,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global cache to store read files
-_files_cache = None
-_cache_timestamp = None
+# The published corpus: an immutable CorpusSnapshot, replaced as a whole by reloads
+_snapshot = None
+# Per-file cache the next reload compares against, written only by reloads:
+# absolute path -> {"size", "mtime_ns", "sha256", "text"}
+_file_entries = {}
+# Files that could not be read: absolute path -> (size, mtime_ns), or None when
+# even their stat failed. They are retried only once that changes.
+_failed_files = {}
+_last_reload_report = None
+_store_loaded = False
+# Single writer: one corpus reload at a time (requests and the corpus watcher)
+_reload_lock = threading.Lock()
+# When the latest reload started checking work_doc (time.monotonic())
+_last_scan_started = None
+# Set while corpus_watcher keeps the corpus up to date: requests then use the
+# loaded corpus without checking work_doc themselves
+_corpus_watched = False
 
-def read_docx_files_from_work_doc(force_reload=False):
+# Assembled documents blocks: (corpus version, document names) -> (block text, tokens).
+# Only blocks made of whole documents are kept; chunk selections differ per question.
+# Least recently used blocks are evicted, whatever their version: requests pinned
+# to an older snapshot may still ask for its blocks.
+_documents_blocks = OrderedDict()
+_documents_blocks_lock = threading.Lock()
+_DOCUMENTS_BLOCK_CACHE_SIZE = 32
+
+# How the latest question in the current thread / async task was answered
+_last_request_info = contextvars.ContextVar("last_request_info", default=None)
+
+_DOCUMENTS_HEADER = "="*80 + "\n" + "WORK DOCUMENTS TO ANALYZE:\n" + "="*80 + "\n\n"
+_SUMMARIES_HEADER = "="*80 + "\n" + "WORK DOCUMENT FACT SHEETS TO ANALYZE (one per document):\n" + "="*80 + "\n\n"
+_FINDINGS_HEADER = "="*80 + "\n" + "FINDINGS FROM EACH PART OF THE WORK DOCUMENTS:\n" + "="*80 + "\n\n"
+_SECTION_HEADERS = {"documents": _DOCUMENTS_HEADER, "summaries": _SUMMARIES_HEADER, "findings": _FINDINGS_HEADER}
+
+# Directory holding the .docx work documents
+WORK_DOC_DIR = os.getenv("WORK_DOC_DIR", str(Path(__file__).parent / "work_doc"))
+
+# What the LLM receives with each question:
+#   "auto"      - per-document summaries for broad questions, retrieval for the rest
+#   "retrieval" - only the BM25 top-ranked chunks (see RETRIEVAL_TOP_K / RETRIEVAL_TOKEN_BUDGET)
+#   "summaries" - the stored per-document summaries (see document_summaries.py)
+#   "fanout"    - broad questions are asked of each document (or quarter) in parallel and the
+#                 partial answers merged (see fanout.py); retrieval for the rest
+#   "full"      - the full text of every document
+CONTEXT_MODE = os.getenv("CONTEXT_MODE", "auto")
+
+# In auto / fanout mode, time-scoped questions spanning at least this many documents are broad
+SUMMARY_MIN_DOCUMENTS = int(os.getenv("SUMMARY_MIN_DOCUMENTS", "4"))
+# In auto / fanout mode, questions without a time range are broad when they ask about the whole picture
+_BROAD_QUESTION_RE = re.compile(
+    r"\b(?:summary|summari[sz]e|overview|overall|progress(?:ion)?|growth|grown|career|trajector(?:y|ies)|"
+    r"trends?|highlights?|themes?|patterns?|annual|yearly|entire|whole|across|throughout|leadership|"
+    r"review|evolv(?:e|ed|ing)|journey)\b"
+)
+
+# Answer plain count questions ("How many PRs merged in October 2025?") from the
+# metrics table extracted from the documents, without calling the LLM
+METRICS_FAST_PATH = os.getenv("METRICS_FAST_PATH", "1") == "1"
+
+def _hash_file(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's bytes.
     """
-    Reads all .docx files from the work_doc directory and returns a dictionary
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_docx_files_from_work_doc(force_reload=False, prebuild_indexes=False):
+    """
+    Reads all .docx files from the work_doc directory (WORK_DOC_DIR) and returns a dictionary
     with filename as key and text content as value.
-    Uses caching to avoid re-reading files unless force_reload=True or files have changed.
+    Files are cached individually by path, size, mtime and content hash, so only
+    added or changed files are re-parsed and deleted files are dropped.
+    Extracted text is also persisted to the on-disk corpus store, so a fresh
+    process only re-parses files whose content hash is not already stored.
+    Large parses can be spread across a process pool (see DOCX_WORKERS).
+    Pass force_reload=True to re-parse every file. With prebuild_indexes, the
+    indexes of a changed corpus are built before it replaces the current one, so
+    requests keep using the old corpus and indexes until the new ones are ready.
+    The returned dictionary is read-only: it belongs to the published snapshot
+    (see get_snapshot).
+    """
+    snapshot = _reload(force_reload, prebuild_indexes)
+    return snapshot.documents if snapshot is not None else {}
+
+def _reload(force_reload=False, prebuild_indexes=False):
+    """
+    Brings the published snapshot up to date with work_doc and returns it, or
+    None when work_doc cannot be read. Reloads are serialized; a caller that
+    waited while another reload checked work_doc reuses that reload's result
+    instead of checking again.
     """
-    global _files_cache, _cache_timestamp
+    requested = time.monotonic()
+    with _reload_lock:
+        snapshot = _snapshot
+        if (not force_reload and snapshot is not None and
+                _last_scan_started is not None and _last_scan_started >= requested):
+            return snapshot
+        return _read_docx_files(force_reload, prebuild_indexes)
+
+def _read_docx_files(force_reload, prebuild_indexes):
+    global _snapshot, _file_entries, _failed_files, _last_reload_report, _store_loaded, _last_scan_started
     
-    work_doc_path = Path(__file__).parent / "work_doc"
+    _last_scan_started = time.monotonic()
+    work_doc_path = Path(WORK_DOC_DIR)
     
     if not work_doc_path.exists():
         logger.error(f"work_doc directory not found at {work_doc_path}")
-        return {}
+        return None
     
-    # Check if we need to reload files
-    current_timestamp = work_doc_path.stat().st_mtime
+    # On first use, seed the per-file cache from the on-disk store
+    if not _store_loaded and not force_reload:
+        _file_entries = load_corpus(DOCX_EXTRACTOR)
+        _store_loaded = True
+        if _file_entries:
+            logger.info(f"Loaded {len(_file_entries)} files from corpus store")
     
-    # Return cached data if available and not forced to reload and directory hasn't changed
-    if (not force_reload and 
-        _files_cache is not None and 
-        _cache_timestamp is not None and 
-        _cache_timestamp == current_timestamp):
-        logger.info(f"Using cached data for {len(_files_cache)} files")
-        return _files_cache
-    
-    # Read files fresh
-    logger.info("Reading files from work_doc directory...")
-    file_dict = {}
+    report = {"added": [], "changed": [], "removed": [], "unchanged": [], "failed": []}
+    entries = {}
+    # Files whose text has to be extracted: path -> (stat, sha256, previous entry)
+    pending = {}
+    # Files that could not be read in this scan: path -> (size, mtime_ns) or None
+    failures = {}
     
     try:
-        # Get all .docx files in the work_doc directory
-        docx_files = list(work_doc_path.glob("*.docx"))
-        logger.info(f"Found {len(docx_files)} .docx files in work_doc directory")
+        # Get all .docx files in the work_doc directory, in a stable order
+        docx_files = sorted(work_doc_path.glob("*.docx"))
         
         for file_path in docx_files:
+            key = str(file_path)
+            previous = _file_entries.get(key)
+            stat = None
             try:
-                # Read the document
-                doc = Document(file_path)
+                stat = file_path.stat()
+                
+                # Failed before and not modified since: don't parse it again
+                if (not force_reload and key in _failed_files and
+                        _failed_files[key] == (stat.st_size, stat.st_mtime_ns)):
+                    failures[key] = _failed_files[key]
+                    continue
                 
-                # Extract all text from paragraphs
-                text_content = []
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():  # Only add non-empty paragraphs
-                        text_content.append(paragraph.text.strip())
+                # Same size and mtime: trust the cached text without hashing
+                if (not force_reload and
+                    previous is not None and
+                    previous["size"] == stat.st_size and
+                    previous["mtime_ns"] == stat.st_mtime_ns):
+                    entries[key] = previous
+                    continue
                 
-                # Join all paragraphs with newlines
-                full_text = "\n".join(text_content)
+                sha256 = _hash_file(file_path)
                 
-                # Use filename without extension as the key
-                file_name = file_path.stem
-                file_dict[file_name] = full_text
+                # Touched but identical content: keep the text, refresh the stat info
+                if not force_reload and previous is not None and previous["sha256"] == sha256:
+                    entries[key] = dict(previous, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                    continue
                 
-                logger.info(f"Successfully read {file_name}: {len(full_text)} characters")
+                pending[key] = (stat, sha256, previous)
                 
             except Exception as e:
-                logger.error(f"Error reading file {file_path.name}: {e}")
+                failures[key] = (stat.st_size, stat.st_mtime_ns) if stat is not None else None
+                if _failed_files.get(key, ()) != failures[key]:
+                    logger.error(f"Error reading file {file_path.name}: {e}")
+                continue
+        
+        # Content seen before (e.g. copied or restored file): reuse stored text
+        stored_texts = {}
+        if not force_reload:
+            for key, (stat, sha256, previous) in pending.items():
+                text = load_text(sha256, DOCX_EXTRACTOR)
+                if text is not None:
+                    stored_texts[key] = text
+        
+        extracted = extract_many([key for key in pending if key not in stored_texts])
+        
+        for file_path in docx_files:
+            key = str(file_path)
+            if key in entries:
+                report["unchanged"].append(file_path.stem)
+                continue
+            if key not in pending:
+                report["failed"].append(file_path.stem)
                 continue
+            
+            stat, sha256, previous = pending[key]
+            full_text = stored_texts[key] if key in stored_texts else extracted[key]
+            if isinstance(full_text, Exception):
+                logger.error(f"Error reading file {file_path.name}: {full_text}")
+                failures[key] = (stat.st_size, stat.st_mtime_ns)
+                report["failed"].append(file_path.stem)
+                continue
+            
+            entries[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+                "text": full_text,
+            }
+            report["changed" if previous is not None else "added"].append(file_path.stem)
+            logger.info(f"Successfully read {file_path.stem}: {len(full_text)} characters")
     
     except Exception as e:
         logger.error(f"Error accessing work_doc directory: {e}")
-        return {}
+        return None
+    
+    # Keep the resulting dictionary in directory order
+    entries = {str(file_path): entries[str(file_path)] for file_path in docx_files
+               if str(file_path) in entries}
+    
+    report["removed"] = [Path(key).stem for key in _file_entries if key not in entries
+                         and Path(key).stem not in report["failed"]]
     
-    # Update cache
-    _files_cache = file_dict
-    _cache_timestamp = current_timestamp
-    logger.info(f"Cached {len(file_dict)} files")
+    # A file that keeps failing with the same stat changes nothing; a new failure
+    # does (e.g. a document that became unreadable leaves the corpus)
+    new_failures = [key for key, signature in failures.items()
+                    if key not in _failed_files or _failed_files[key] != signature]
+    _failed_files = failures
     
-    return file_dict
+    # Rebuild the assembled dictionary only when something was touched
+    touched = report["added"] or report["changed"] or report["removed"] or new_failures
+    if touched or _snapshot is None:
+        snapshot = CorpusSnapshot(entries)
+        if prebuild_indexes:
+            snapshot.build_indexes()
+        save_corpus(entries, DOCX_EXTRACTOR)
+        # Publish with one reference swap: requests that pinned the previous
+        # snapshot keep using it until they finish
+        _snapshot = snapshot
+        CORPUS_DOCUMENTS.set(len(snapshot))
+        logger.info(
+            f"Reloaded work_doc: {len(report['added'])} added, {len(report['changed'])} changed, "
+            f"{len(report['removed'])} removed, {len(report['unchanged'])} unchanged, "
+            f"{len(report['failed'])} failed"
+        )
+    else:
+        logger.info(f"Using cached data for {len(_snapshot)} files")
+    
+    _file_entries = entries
+    _last_reload_report = report
+    
+    return _snapshot
+
+def get_snapshot():
+    """
+    Returns the current CorpusSnapshot, or None when no documents could be read.
+    A request takes it once and uses its documents, hashes and version to the
+    end, so a concurrent reload can never mix two corpora in one answer. While
+    the corpus watcher runs this is the snapshot it last published, without
+    touching the disk; otherwise work_doc is checked for changes first.
+    """
+    snapshot = _snapshot
+    if _corpus_watched and snapshot is not None:
+        return snapshot
+    return _reload()
+
+def get_corpus():
+    """
+    Returns the documents of the current snapshot (name -> text, read-only), or
+    {} when none could be read.
+    """
+    snapshot = get_snapshot()
+    return snapshot.documents if snapshot is not None else {}
+
+def set_corpus_watched(watched):
+    """
+    Tells requests whether the corpus watcher keeps the corpus up to date, so
+    they can skip checking work_doc themselves.
+    """
+    global _corpus_watched
+    _corpus_watched = watched
+
+def get_last_reload_report():
+    """
+    Returns the report of the last read_docx_files_from_work_doc call: lists of
+    document names that were added, changed, removed, unchanged or failed to parse.
+    """
+    return _last_reload_report
+
+def get_corpus_version():
+    """
+    Returns a short hash identifying the currently loaded set of documents and
+    their contents, or None before the first read. Derived data (indexes,
+    caches) is keyed on it so it is rebuilt only when the corpus changes.
+    Requests use the version of the snapshot they pinned instead.
+    """
+    snapshot = _snapshot
+    return snapshot.version if snapshot is not None else None
 
 def clear_files_cache():
     """
     Clears the cached files data, forcing the next call to read_docx_files_from_work_doc 
-    to read files fresh from disk.
+    to read files fresh from disk. Requests already running keep their snapshot.
     """
-    global _files_cache, _cache_timestamp
-    _files_cache = None
-    _cache_timestamp = None
+    global _snapshot, _file_entries, _failed_files, _last_reload_report
+    with _reload_lock:
+        _snapshot = None
+        _file_entries = {}
+        _failed_files = {}
+        _last_reload_report = None
     logger.info("Files cache cleared")
 
-def work_impact_agent(user_prompt: str = ""):
-    try:
-        # Read all docx files and create dictionary
-        files_dict = read_docx_files_from_work_doc()
+def _select_documents(user_prompt, snapshot, context_mode, search_query=None):
+    """
+    Returns the (document name, text) sections to send to the LLM for a question,
+    in chronological order.
+    Time-scoped questions ("October 2025", "this quarter") only see the documents
+    in that range, sent in full when they fit the retrieval token budget.
+    Otherwise each section holds only that document's top-ranked chunks; full
+    mode, or a question no chunk matches, sends every candidate document in full.
+    search_query, when given, is matched against the chunks instead of the
+    question (follow-ups also search with the previous question).
+    """
+    files_dict, corpus_version = snapshot.documents, snapshot.version
+    in_range = documents_in_range(user_prompt, list(files_dict), corpus_version) if user_prompt else None
+    candidates = sort_chronologically(in_range or list(files_dict))
+    
+    if context_mode != "full" and user_prompt:
+        document_tokens = snapshot.token_counts()
+        if in_range and sum(document_tokens[name] for name in in_range) <= RETRIEVAL_TOKEN_BUDGET:
+            return [(name, files_dict[name]) for name in candidates]
         
-        if not files_dict:
-            logger.warning("No files were read successfully")
+        chunks = retrieve_chunks(search_query or user_prompt, files_dict, corpus_version,
+                                 documents=set(in_range) if in_range else None)
+        if chunks:
+            sections = {}
+            for chunk in chunks:
+                sections.setdefault(chunk["doc"], []).append(chunk["text"])
+            return [(name, "\n[...]\n".join(sections[name])) for name in candidates if name in sections]
+        logger.info("No chunks matched the question, sending full documents")
+    
+    return [(name, files_dict[name]) for name in candidates]
+
+def get_document_hashes():
+    """
+    Returns the content hash of every loaded document: document name -> sha256.
+    """
+    snapshot = _snapshot
+    return dict(snapshot.hashes) if snapshot is not None else {}
+
+def _broad_candidates(user_prompt, snapshot, context_mode):
+    """
+    Returns the documents a broad question covers, in chronological order, or
+    None when the context mode answers the question from the selected documents
+    directly. Broad questions are answered from the document summaries
+    (summaries / auto mode) or fanned out across the documents (fanout mode).
+    """
+    if context_mode not in ("summaries", "auto", "fanout"):
+        return None
+    files_dict = snapshot.documents
+    in_range = documents_in_range(user_prompt, list(files_dict), snapshot.version) if user_prompt else None
+    if context_mode != "summaries":
+        if in_range:
+            broad = len(in_range) >= SUMMARY_MIN_DOCUMENTS
+        else:
+            broad = not user_prompt or bool(_BROAD_QUESTION_RE.search(user_prompt.lower()))
+        if not broad:
             return None
-        
-        logger.info(f"Preparing to send {len(files_dict)} documents to LLM")
-        
-        # Prepare the documents content for the LLM
-        documents_content = "\n\n" + "="*80 + "\n"
-        documents_content += "WORK DOCUMENTS TO ANALYZE:\n"
-        documents_content += "="*80 + "\n\n"
-        
-        for file_name, content in files_dict.items():
-            documents_content += f"📄 **{file_name}**\n"
-            documents_content += f"{'-'*50}\n"
-            documents_content += f"{content}\n\n"
-        
-        # Create the full user prompt that includes both user question and documents
-        full_user_prompt = ""
-        if user_prompt:
-            full_user_prompt += f"USER REQUEST: {user_prompt}\n\n"
-        
-        full_user_prompt += documents_content
+    return sort_chronologically(in_range or list(files_dict))
+
+def _summary_sections(names, snapshot):
+    """
+    Returns the (document name, summary) sections for the named documents along
+    with the name -> summary dictionary, or None when the summaries cannot be
+    produced.
+    """
+    hashes, files_dict = snapshot.hashes, snapshot.documents
+    try:
+        summaries = get_document_summaries([(name, hashes[name], files_dict[name]) for name in names])
+    except Exception as e:
+        logger.warning(f"Document summaries unavailable ({e}), answering from the documents")
+        return None
+    logger.info(f"Answering from the summaries of {len(names)} documents")
+    return [(name, summaries[name]) for name in names], summaries
+
+def prepare_document_summaries():
+    """
+    Makes sure every document has a stored summary when the context mode uses
+    them, so the first broad question doesn't wait for them. Returns the number
+    of documents summarized (0 when summaries are not used).
+    """
+    if CONTEXT_MODE not in ("summaries", "auto"):
+        return 0
+    snapshot = get_snapshot()
+    if not snapshot:
+        return 0
+    get_document_summaries([(name, snapshot.hashes[name], text) for name, text in snapshot.documents.items()])
+    return len(snapshot)
+
+def build_indexes():
+    """
+    Builds everything derived from the loaded corpus that questions use (the
+    retrieval index, the temporal index, the metrics table and the document
+    token counts), so the first question doesn't pay for it. Returns the number
+    of documents indexed.
+    """
+    snapshot = get_snapshot()
+    if not snapshot:
+        return 0
+    snapshot.build_indexes()
+    return len(snapshot)
+
+def _shard_documents(names):
+    """
+    Splits documents into fan-out shards: one per document, or one per quarter
+    with FANOUT_SHARD=quarter (undated documents get a shard each).
+    Returns a list of (label, document names).
+    """
+    if FANOUT_SHARD != "quarter":
+        return [(name, [name]) for name in names]
+    shards = {}
+    for name in names:
+        month = parse_document_month(name)
+        label = f"Q{(month[1] - 1) // 3 + 1} {month[0]}" if month else name
+        shards.setdefault(label, []).append(name)
+    return list(shards.items())
+
+def _section_heading(file_name):
+    return f"📄 **{file_name}**\n{'-'*50}\n"
+
+def _fit_to_budget(sections, snapshot, fixed_tokens, source=None):
+    """
+    Drops or trims sections so the whole prompt stays within PROMPT_TOKEN_BUDGET.
+    The most recent documents have priority; undated documents come last.
+    source is the dictionary the section texts come from (the snapshot's
+    documents by default).
+    """
+    names = [name for name, _ in sections]
+    dated = [name for name in names if parse_document_month(name) is not None]
+    priority = list(reversed(dated)) + [name for name in names if name not in dated]
+    
+    # Full documents reuse the per-version token counts; anything else is counted
+    section_tokens = {}
+    if source is None:
+        document_tokens = snapshot.token_counts()
+        section_tokens = {name: document_tokens[name] for name, text in sections
+                          if text is snapshot.documents.get(name)}
+    
+    fitted, dropped, trimmed = fit_sections_to_budget(
+        sections, priority, PROMPT_TOKEN_BUDGET - fixed_tokens, section_tokens,
+        section_overhead=count_tokens(_section_heading(names[0]) + "\n\n") if names else 0,
+    )
+    if dropped or trimmed:
+        logger.warning(f"Prompt over the {PROMPT_TOKEN_BUDGET} token budget: dropped {dropped}, trimmed {trimmed}")
+    return fitted
+
+def _documents_block(sections, source, corpus_version, kind="documents"):
+    """
+    Returns the documents part of the prompt for the (document name, text)
+    sections and the tokens its sections take (the header is not counted).
+    Blocks made of unmodified texts from source (the documents, or their
+    summaries for kind="summaries") are built once per corpus version and
+    reused, so identical selections produce a byte-identical prompt prefix that
+    the service's prompt caching can reuse. Shard findings differ per question
+    and are never reused.
+    """
+    whole_documents = kind != "findings" and all(text is source.get(name) for name, text in sections)
+    key = (corpus_version, kind, tuple(name for name, _ in sections))
+    
+    if whole_documents:
+        with _documents_blocks_lock:
+            cached = _documents_blocks.get(key)
+            if cached is not None:
+                _documents_blocks.move_to_end(key)
+                return cached
+    
+    header = _SECTION_HEADERS[kind]
+    parts = [f"{_section_heading(file_name)}{content}\n\n" for file_name, content in sections]
+    block = ("".join([header] + parts), sum(count_tokens(part) for part in parts))
+    
+    if whole_documents:
+        with _documents_blocks_lock:
+            _documents_blocks[key] = block
+            while len(_documents_blocks) > _DOCUMENTS_BLOCK_CACHE_SIZE:
+                _documents_blocks.popitem(last=False)
+    return block
+
+def _prepare_request(user_prompt, context_mode, history=None, on_stage=None):
+    """
+    Does everything that happens before the LLM call. Returns None when no
+    documents could be read, {"answer": ..., "source": "metrics" | "cache"} when
+    the question is answered without the LLM, or a dictionary with the
+    "user_prompt" to send, its "prompt_tokens" and the "cache_key" /
+    "corpus_version" to store the response under. The prompt is kept within
+    PROMPT_TOKEN_BUDGET by dropping or trimming the oldest documents.
+    Fanned-out requests carry "shards" instead of "user_prompt" until
+    _run_fanout / _run_fanout_async has run the sub-queries.
+    history is the chat so far ([{"role", "content"}, ...]) for follow-up questions.
+    on_stage is called with the name of each stage as it begins.
+    """
+    started = time.perf_counter()
+    
+    # Pin the corpus snapshot: the whole request uses these documents and version
+    with timed_stage("corpus_load", on_stage):
+        snapshot = get_snapshot()
+    
+    if not snapshot:
+        logger.warning("No files were read successfully")
+        return None
+    
+    if METRICS_FAST_PATH and user_prompt:
+        metrics_answer = answer_from_metrics(user_prompt, snapshot.documents, snapshot.version)
+        if metrics_answer:
+            return {"answer": metrics_answer, "source": "metrics", "started": started}
+    
+    context_mode = context_mode or CONTEXT_MODE
+    corpus_version = snapshot.version
+    variant = f"{context_mode}:{summary_variant()}" if context_mode in ("summaries", "auto") else context_mode
+    if history_key(history):
+        variant += f":{history_key(history)}"
+    cache_key = make_cache_key(user_prompt, corpus_version, SYSTEM_PROMPT, DEFAULT_MODEL, variant)
+    cached_response = get_cached_response(cache_key)
+    if cached_response is not None:
+        logger.info("Serving response from cache")
+        return {"answer": cached_response, "source": "cache", "started": started}
+    
+    request = {"cache_key": cache_key, "corpus_version": corpus_version, "snapshot": snapshot, "started": started}
+    with timed_stage("prompt_assembly", on_stage):
+        _build_prompt(request, user_prompt, context_mode, history)
+    return request
+
+def _build_prompt(request, user_prompt, context_mode, history):
+    """
+    Fills a request with its prompt (or fan-out shards): picks the documents,
+    summaries or shards the question needs from the request's snapshot and
+    assembles them with the earlier conversation.
+    """
+    snapshot = request["snapshot"]
+    files_dict, corpus_version = snapshot.documents, snapshot.version
+    
+    # Follow-ups ("and in October?") are routed with the previous question: its
+    # time range applies unless the follow-up names its own, and retrieval
+    # searches with both
+    previous = previous_question(history)
+    conversation = build_conversation_context(history)
+    routing_query, search_query = user_prompt, None
+    if previous:
+        search_query = f"{previous} {user_prompt}"
+        if question_date_range(user_prompt, list(files_dict), corpus_version) is None:
+            routing_query = search_query
+    
+    broad_names = _broad_candidates(routing_query, snapshot, context_mode)
+    
+    # Fan-out: each shard gets its own sub-query (see _run_fanout), then one merge call
+    if context_mode == "fanout" and broad_names and len(broad_names) > 1:
+        shards = _shard_documents(broad_names)
+        request["shards"] = [
+            (label, _assemble_prompt(user_prompt, [(name, files_dict[name]) for name in names],
+                                     snapshot, files_dict, "documents", SHARD_SYSTEM_PROMPT, conversation)[0])
+            for label, names in shards
+        ]
+        request["question"] = user_prompt
+        request["conversation"] = conversation
+        logger.info(f"Fanning out over {len(shards)} shards of {len(broad_names)} documents")
+        return
+    
+    # Broad questions are answered from the per-document summaries (map), combined
+    # by this one call (reduce); everything else sees the documents themselves
+    summarized = _summary_sections(broad_names, snapshot) if broad_names and context_mode != "fanout" else None
+    if summarized:
+        (sections, source), kind = summarized, "summaries"
+    else:
+        sections = _select_documents(routing_query, snapshot, context_mode, search_query)
+        source, kind = files_dict, "documents"
+    
+    request["user_prompt"], request["prompt_tokens"] = _assemble_prompt(
+        user_prompt, sections, snapshot, source, kind, conversation=conversation
+    )
 
-        ask_llm_response = ask_llm(system_prompt=SYSTEM_PROMPT, user_prompt=full_user_prompt)
-        logger.info("Received response from LLM")       
-        return ask_llm_response
+def _assemble_prompt(user_prompt, sections, snapshot, source, kind, system_prompt=SYSTEM_PROMPT, conversation=""):
+    """
+    Builds the user message for the (document name, text) sections, the earlier
+    conversation and the question, kept within PROMPT_TOKEN_BUDGET. source is
+    where the section texts come from and kind what they are ("documents",
+    "summaries" or "findings"). Returns (prompt, prompt tokens).
+    """
+    # The conversation and question go last: the system prompt and documents block
+    # then form a prefix that stays identical across questions about the same documents
+    request_content = conversation + (("="*80 + "\n" + f"USER REQUEST: {user_prompt}\n") if user_prompt else "")
+    
+    header = _SECTION_HEADERS[kind]
+    fixed_tokens = count_message_tokens(system_prompt, header + request_content)
+    sections = _fit_to_budget(sections, snapshot, fixed_tokens, None if kind == "documents" else source)
+    logger.info(f"Preparing to send {len(sections)} sections ({kind}) to LLM")
+    
+    documents_content, documents_tokens = _documents_block(sections, source, snapshot.version, kind)
+    prompt_tokens = fixed_tokens + documents_tokens
+    logger.info(f"Prompt size: {prompt_tokens} tokens{token_count_label()} (budget {PROMPT_TOKEN_BUDGET})")
+    
+    return documents_content + request_content, prompt_tokens
+
+def _merge_request(request, fanned_out):
+    """
+    Turns a fanned-out request into the merge call: the user prompt becomes the
+    question over the findings of every shard.
+    """
+    findings = fanned_out["findings"]
+    request["user_prompt"], request["prompt_tokens"] = _assemble_prompt(
+        request["question"], list(findings.items()), request["snapshot"], findings, "findings", conversation=request["conversation"]
+    )
+    request["shard_tokens"] = fanned_out["tokens"]
+    request["timings"] = {
+        "prepare": request["fanout_started"] - request["started"],
+        "shards": fanned_out["seconds"],
+        "slowest_shard": fanned_out["slowest"],
+        "merge_started": time.perf_counter(),
+    }
+
+def _run_fanout(request):
+    """
+    Runs the shard sub-queries of a fanned-out request in parallel and prepares
+    its merge call.
+    """
+    request["fanout_started"] = time.perf_counter()
+    _merge_request(request, run_shards(SHARD_SYSTEM_PROMPT, request["shards"]))
+
+async def _run_fanout_async(request):
+    """
+    Async variant of _run_fanout.
+    """
+    request["fanout_started"] = time.perf_counter()
+    _merge_request(request, await run_shards_async(SHARD_SYSTEM_PROMPT, request["shards"]))
+
+def _store_response(request, response):
+    """
+    Caches a completed LLM response for the prepared request, along with the
+    tokens it cost (as reported by the service, or counted when it reports none),
+    and reports the stage timings of fanned-out requests.
+    """
+    timings = request.get("timings")
+    if timings:
+        logger.info(
+            f"Fan-out timings: prepare {timings['prepare'] * 1000:.0f} ms, "
+            f"{len(request['shards'])} shards {timings['shards'] * 1000:.0f} ms "
+            f"(slowest {timings['slowest_shard'] * 1000:.0f} ms), "
+            f"merge {(time.perf_counter() - timings['merge_started']) * 1000:.0f} ms, "
+            f"total {(time.perf_counter() - request['started']) * 1000:.0f} ms"
+        )
+    if response:
+        usage = get_last_usage()
+        tokens = usage["total_tokens"] if usage else request["prompt_tokens"] + count_tokens(response)
+        tokens += request.get("shard_tokens", 0)
+        cache_response(request["cache_key"], response, tokens, request["corpus_version"], get_corpus_version())
+
+def _record_request(request, source):
+    """
+    Remembers how the current question was answered, for get_last_request_info(),
+    and reports it to the telemetry counters.
+    """
+    info = {"source": source, "prompt_tokens": None, "usage": None, "shard_tokens": 0}
+    if source == "llm":
+        info.update(prompt_tokens=request.get("prompt_tokens"), usage=request.get("usage"),
+                    shard_tokens=request.get("shard_tokens", 0))
+    _last_request_info.set(info)
+    record_request(source, time.perf_counter() - request["started"], info["usage"], info["shard_tokens"])
+
+def get_last_request_info():
+    """
+    Returns how the latest question asked in the current thread or async task
+    was answered: {"source", "prompt_tokens", "usage", "shard_tokens"}, where
+    source is "metrics" (metrics table), "cache" (response cache), "shared"
+    (an identical request in flight) or "llm"; usage is the token usage the
+    service reported for the final call and shard_tokens what fan-out
+    sub-queries used. None before the first answer.
+    """
+    return _last_request_info.get()
+
+@contextmanager
+def _agent_errors(name):
+    """
+    Error handling shared by the agent entry points: typed LLM failures carry a
+    user-facing message and are re-raised for the caller to show; anything else
+    is logged and swallowed (the caller then returns its empty result). Both are
+    counted.
+    """
+    try:
+        yield
+    except LLMError as e:
+        record_error(e)
+        raise
     except Exception as e:
-        logger.error(f"Error occurred in work_impact_agent: {e}")
-        return {}
\ No newline at end of file
+        record_error(e)
+        logger.error(f"Error occurred in {name}: {e}")
+
+def _cached_after_lead(request, flight):
+    """
+    Re-checks the response cache once a request leads its flight: the previous
+    leader may have cached the answer after this request's cache lookup. On a
+    hit the flight ends with that answer, which is returned; else None.
+    """
+    cached_response = get_cached_response(request["cache_key"], count_miss=False)
+    if cached_response is None:
+        return None
+    logger.info("Serving response from cache (stored by the previous identical request)")
+    flight.publish(cached_response)
+    flight.finish()
+    _record_request(request, "cache")
+    return cached_response
+
+def _store_answer(request, parts):
+    """
+    Caches the leader's complete answer and remembers its token usage for
+    _record_request (which may run in another thread or task).
+    """
+    logger.info("Received streamed response from LLM")
+    request["usage"] = get_last_usage()
+    _store_response(request, "".join(parts))
+
+def _drain_stream(request, flight, stream, parts):
+    """
+    Finishes a leader's LLM stream for its followers after the leader's own
+    consumer went away mid-answer.
+    """
+    try:
+        for delta in stream:
+            parts.append(delta)
+            flight.publish(delta)
+        _store_answer(request, parts)
+    except Exception as e:
+        flight.finish(e)
+        return
+    flight.finish()
+
+def _answer_deltas(request, on_stage=None):
+    """
+    Yields the answer to a prepared request in text pieces. Answers that need no
+    LLM call come in one piece. Otherwise the first of identical concurrent
+    requests leads: it streams the answer from the LLM, publishes each piece to
+    the followers, caches the answer and ends the flight; followers yield the
+    leader's pieces as they arrive. If the leader's consumer goes away
+    mid-answer, the answer is finished in the background for the followers; if
+    the leader is cancelled before answering, followers answer themselves.
+    """
+    if "answer" in request:
+        _record_request(request, request["source"])
+        yield request["answer"]
+        return
+    
+    while True:
+        flight, leader = join_flight(request["cache_key"])
+        if leader:
+            break
+        received = False
+        try:
+            for delta in flight.iter_deltas():
+                received = True
+                yield delta
+        except FlightCancelled:
+            if received:
+                raise
+            continue
+        _record_request(request, "shared")
+        return
+    
+    stream = None
+    parts = []
+    try:
+        cached_response = _cached_after_lead(request, flight)
+        if cached_response is not None:
+            yield cached_response
+            return
+        if "shards" in request:
+            with timed_stage("fanout", on_stage):
+                _run_fanout(request)
+        with timed_stage("llm_total", on_stage):
+            llm_started = time.perf_counter()
+            stream = ask_llm_stream(system_prompt=SYSTEM_PROMPT, user_prompt=request["user_prompt"])
+            for delta in stream:
+                if not parts:
+                    observe_stage("llm_ttft", time.perf_counter() - llm_started)
+                parts.append(delta)
+                flight.publish(delta)
+                yield delta
+        _store_answer(request, parts)
+        _record_request(request, "llm")
+    except GeneratorExit:
+        if flight.done:
+            raise
+        if stream is not None and flight.followers:
+            # The consumer stopped reading: finish the answer for the followers
+            threading.Thread(
+                target=_drain_stream, args=(request, flight, stream, parts), name="flight-drain", daemon=True
+            ).start()
+        else:
+            flight.finish(FlightCancelled("The request answering this question was cancelled"))
+        raise
+    except BaseException as e:
+        flight.finish(e)
+        raise
+    flight.finish()
+
+async def _produce_answer_async(request, flight, on_stage):
+    """
+    Task that answers a flight's request from the LLM and publishes each piece.
+    It runs apart from the leader's consumer, so followers still get the whole
+    answer when the leader's client disconnects.
+    """
+    try:
+        if "shards" in request:
+            with timed_stage("fanout", on_stage):
+                await _run_fanout_async(request)
+        parts = []
+        with timed_stage("llm_total", on_stage):
+            llm_started = time.perf_counter()
+            async for delta in ask_llm_stream_async(system_prompt=SYSTEM_PROMPT, user_prompt=request["user_prompt"]):
+                if not parts:
+                    observe_stage("llm_ttft", time.perf_counter() - llm_started)
+                parts.append(delta)
+                flight.publish(delta)
+        _store_answer(request, parts)
+    except BaseException as e:
+        flight.finish(e)
+        if not isinstance(e, Exception):
+            raise
+        return
+    flight.finish()
+
+async def _answer_deltas_async(request, on_stage=None):
+    """
+    Async variant of _answer_deltas: the LLM stream and waiting for a leader
+    hold no thread. The leader's LLM call runs in its own task, which is only
+    cancelled with the leader when no follower waits for the answer.
+    """
+    if "answer" in request:
+        _record_request(request, request["source"])
+        yield request["answer"]
+        return
+    
+    while True:
+        flight, leader = join_flight(request["cache_key"])
+        if leader:
+            break
+        received = False
+        try:
+            async for delta in flight.aiter_deltas():
+                received = True
+                yield delta
+        except FlightCancelled:
+            if received:
+                raise
+            continue
+        _record_request(request, "shared")
+        return
+    
+    try:
+        cached_response = _cached_after_lead(request, flight)
+    except BaseException as e:
+        flight.finish(e)
+        raise
+    if cached_response is not None:
+        yield cached_response
+        return
+    
+    producer = asyncio.create_task(_produce_answer_async(request, flight, on_stage))
+    try:
+        async for delta in flight.aiter_deltas():
+            yield delta
+    except (asyncio.CancelledError, GeneratorExit):
+        if not flight.followers:
+            producer.cancel()
+        raise
+    _record_request(request, "llm")
+
+def work_impact_agent(user_prompt: str = "", context_mode: str = None, history: list = None, on_stage=None):
+    """
+    Answers a question about the work documents. history is the chat so far
+    ([{"role": "user" | "assistant", "content": ...}, ...]), so follow-up
+    questions can refer to earlier turns. Identical questions already being
+    answered share that answer instead of calling the LLM again. on_stage, when
+    given, is called with the name of each stage as it begins ("corpus_load",
+    "prompt_assembly", "fanout", "llm_total"). Raises an LLMError subclass when
+    the LLM call fails after retries.
+    """
+    with _agent_errors("work_impact_agent"):
+        _last_request_info.set(None)
+        request = _prepare_request(user_prompt, context_mode, history, on_stage)
+        if request is None:
+            return None
+        return "".join(_answer_deltas(request, on_stage))
+    return {}
+
+def work_impact_agent_stream(user_prompt: str = "", context_mode: str = None, history: list = None, on_stage=None):
+    """
+    Streaming variant of work_impact_agent: a generator that yields the answer in
+    text pieces as the LLM produces them. Answers that need no LLM call are
+    yielded in one piece. Yields nothing if no answer could be produced.
+    Requests joining an identical in-flight request receive its pieces as they arrive.
+    """
+    with _agent_errors("work_impact_agent_stream"):
+        _last_request_info.set(None)
+        request = _prepare_request(user_prompt, context_mode, history, on_stage)
+        if request is not None:
+            yield from _answer_deltas(request, on_stage)
+
+async def work_impact_agent_async(user_prompt: str = "", context_mode: str = None, history: list = None, on_stage=None):
+    """
+    Async variant of work_impact_agent. Document loading and prompt assembly run
+    in a worker thread; the LLM call itself holds no thread while it waits.
+    """
+    with _agent_errors("work_impact_agent_async"):
+        _last_request_info.set(None)
+        request = await asyncio.to_thread(_prepare_request, user_prompt, context_mode, history, on_stage)
+        if request is None:
+            return None
+        return "".join([delta async for delta in _answer_deltas_async(request, on_stage)])
+    return {}
+
+async def work_impact_agent_stream_async(user_prompt: str = "", context_mode: str = None, history: list = None, on_stage=None):
+    """
+    Async variant of work_impact_agent_stream: an async generator yielding the
+    answer in text pieces as the LLM produces them.
+    """
+    with _agent_errors("work_impact_agent_stream_async"):
+        _last_request_info.set(None)
+        request = await asyncio.to_thread(_prepare_request, user_prompt, context_mode, history, on_stage)
+        if request is not None:
+            async for delta in _answer_deltas_async(request, on_stage):
+                yield delta